@@ -6,7 +6,7 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from models import User
-from utils import get_db
+from database import get_db
 from config import settings
 
 # Configuration
@@ -0,0 +1,134 @@
+"""Dynamic micro-batching of embedding requests across concurrent callers."""
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class BatcherMetrics:
+    """Batch-size histogram and queue-wait/encode-time samples for tuning the batcher."""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        # None counts batches larger than the last bucket
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS + (None,)}
+        self.queue_waits = deque(maxlen=window)
+        self.encode_times = deque(maxlen=window)
+
+    def record_batch(self, size: int, waits: Sequence[float], encode_time: float):
+        with self.lock:
+            self.batches += 1
+            self.items += size
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), None)
+            self.batch_size_histogram[bucket] += 1
+            self.queue_waits.extend(waits)
+            self.encode_times.append(encode_time)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            waits = sorted(self.queue_waits)
+            encodes = sorted(self.encode_times)
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "batch_size_histogram": {
+                    f"<={b}" if b is not None else f">{BATCH_SIZE_BUCKETS[-1]}": n
+                    for b, n in self.batch_size_histogram.items()
+                },
+                "queue_wait_ms": {
+                    "p50": round(percentile(waits, 50) * 1000, 2),
+                    "p95": round(percentile(waits, 95) * 1000, 2),
+                    "p99": round(percentile(waits, 99) * 1000, 2),
+                },
+                "encode_ms": {
+                    "p50": round(percentile(encodes, 50) * 1000, 2),
+                    "p95": round(percentile(encodes, 95) * 1000, 2),
+                },
+            }
+
+
+class EmbeddingBatcher:
+    """Collects concurrent single-text embedding requests into batched encode calls.
+
+    Callers block in embed() while a background thread gathers requests for up to
+    max_wait_ms or max_batch_size items, encodes them in one call to encode_fn and
+    hands each caller its own row of the result.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Sequence], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.metrics = BatcherMetrics()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def embed(self, text: str):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so a batcher created in the serve.py parent
+        # starts its own thread lazily in each worker.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            waits = [started - enqueued for _, _, enqueued in batch]
+            try:
+                vectors = self.encode_fn([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.metrics.record_batch(len(batch), waits, time.perf_counter() - started)
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self._queue.qsize(),
+            **self.metrics.snapshot(),
+        }
@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     
     # OpenAI Configuration
     openai_api_key: str = ""
+    openai_base_url: str = ""  # Override to point at an OpenAI-compatible server, e.g. openai_stub.py
     
     # Database Configuration
     database_url: str = "sqlite:///./chatbot.db"
@@ -27,14 +28,79 @@ class Settings(BaseSettings):
     # File Upload Configuration
     max_file_size: int = 10485760  # 10MB in bytes
     allowed_file_types: str = "pdf,txt,docx"
+    ingest_workers: int = 4  # Parallel extractors per batch upload
     
     # Rate Limiting
-    rate_limit_per_minute: int = 60
+    rate_limit_enabled: bool = True
+    rate_limit_per_minute: int = 60  # /query per user
+    rate_limit_burst: int = 0  # Bucket size; 0 means one minute's worth
+    chatbot_rate_limit_per_minute: int = 120  # /query per chatbot, across users
+    upload_rate_limit_per_minute: int = 5  # /upload per user and per chatbot
+    public_rate_limit_per_minute: int = 20  # Public chatbot queries per anonymous session
+    public_ip_rate_limit_per_minute: int = 60  # Public chatbot queries per client IP, with or without a session
+    public_chatbot_rate_limit_per_minute: int = 6000  # Public queries per chatbot across all visitors
+    rate_limit_backend: str = "memory"  # "memory" (per worker) or "redis" (shared)
+    redis_url: str = "redis://localhost:6379/0"
+    
+    # Admission control (per worker)
+    max_inflight_llm_calls: int = 16
+    max_inflight_ingestions: int = 2
+    admission_queue_size: int = 32
+    admission_queue_timeout: float = 2.0  # Seconds a request may wait for a slot
+    admission_retry_after: int = 1
+    
+    # Batch question answering (/query/batch)
+    batch_query_max_questions: int = 500  # Also capped by the /query rate limit bucket (60 by default)
+    batch_query_concurrency: int = 8  # LLM calls in flight per batch request
+    
+    # Embedding backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, see onnx_export.py)
+    embedding_backend: str = "torch"
+    onnx_model_dir: str = "models/all-MiniLM-L6-v2-onnx"
+    onnx_quantized: bool = True
+    onnx_threads: int = 0  # 0 lets ONNX Runtime decide
+    
+    # Query embedding micro-batching
+    embedding_batching: bool = True
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
+    
+    # Load ML/PDF/crawler stacks in the background at startup (otherwise on first use)
+    warmup_on_startup: bool = True
+    
+    # Public chatbot endpoint caches (per worker)
+    public_bot_cache_ttl: int = 30  # Seconds a public chatbot snapshot is reused
+    public_session_cache_size: int = 100000
+    public_session_flush_interval: float = 10.0  # Seconds between bulk last_activity writes
+    
+    # Cold-chatbot storage tiering
+    tiering_enabled: bool = True
+    archive_dir: str = "storage_archive"
+    tiering_idle_days: int = 14  # Archive chatbots with no queries or training for this long
+    tiering_interval: int = 3600  # Seconds between tiering passes
+    tiering_min_hot_seconds: int = 600  # Never archive for budget what was used this recently
+    storage_disk_budget_mb: int = 0  # Hot storage budget per node; 0 disables
+    tiering_compress_level: int = 6
+    
+    # Duplicate chunk elimination before embedding
+    dedup_enabled: bool = True
+    dedup_similarity: float = 0.9  # Shingle Jaccard similarity at which chunks count as duplicates; 1.0 = exact only
+    dedup_num_perm: int = 128  # MinHash permutations
+    dedup_shingle_size: int = 3  # Words per shingle
+    
+    # Opt-in request profiling; empty admin token disables it entirely
+    profiling_admin_token: str = ""
+    profiling_sample_rate: float = 0.0  # Fraction of requests profiled without the header
+    profiling_interval_ms: float = 5.0  # Stack sampling interval
+    profiling_dir: str = "profiles"
+    profiling_max_profiles: int = 200  # Oldest profiles beyond this are deleted
+    profiling_traceback_depth: int = 1  # tracemalloc frames kept per allocation
+    profiling_top_allocations: int = 25
     
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
     workers: int = 4
+    graceful_timeout: int = 30  # Seconds to let in-flight requests finish on restart/shutdown
     
     @property
     def allowed_origins_list(self) -> List[str]:
@@ -0,0 +1,180 @@
+"""
+Duplicate chunk elimination between chunking and embedding.
+
+Crawled sites repeat headers, sidebars and legal text on every page, which
+would otherwise be embedded once per occurrence. Chunks are dropped when
+they are
+
+- exact duplicates: same BLAKE2 hash of their whitespace/case-normalised text;
+- near duplicates: estimated Jaccard similarity of their word shingles at or
+  above DEDUP_SIMILARITY, found with MinHash signatures (numpy) and banded
+  LSH, then confirmed on the full signature.
+
+The first occurrence is kept, in ingestion order, and records every source
+the dropped copies came from in its "sources" metadata so answers can still
+be attributed to all of them.
+
+Copies only line up as duplicate chunks if they are chunked the same way on
+every page, whatever content comes before them. chunk_sources therefore
+packs chunks from whole lines and gives lines that repeat across the batch
+chunks of their own; each crawled page is a separate source, so chunking
+restarts at every page.
+
+    python dedup.py
+
+checks this end to end on two crawled pages sharing a contact block.
+"""
+import hashlib
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalise(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def chunk_sources(sources, chunk_size: int = 500, isolate_repeated: bool = True):
+    """Split (source, text) pairs into (source, chunk) pairs of at most chunk_size characters.
+
+    Chunks are packed from whole lines; a line longer than chunk_size is cut
+    into chunk_size windows. With isolate_repeated, runs of lines that occur
+    more than once across all sources never share a chunk with other lines.
+    """
+    sources = [(source, [line.strip() for line in text.splitlines() if line.strip()]) for source, text in sources]
+    counts = Counter(_normalise(line) for _, lines in sources for line in lines) if isolate_repeated else Counter()
+
+    chunks = []
+    for source, lines in sources:
+        current, size, current_repeated = [], 0, False
+
+        def flush():
+            if current:
+                chunks.append((source, "\n".join(current)))
+                current.clear()
+
+        for line in lines:
+            repeated = counts[_normalise(line)] > 1
+            if current and (repeated != current_repeated or size + 1 + len(line) > chunk_size):
+                flush()
+            if len(line) > chunk_size:
+                chunks.extend((source, line[i:i + chunk_size]) for i in range(0, len(line), chunk_size))
+                continue
+            size = len(line) if not current else size + 1 + len(line)
+            current.append(line)
+            current_repeated = repeated
+        flush()
+    return chunks
+
+
+def _lsh_params(num_perm: int, threshold: float):
+    """(bands, rows) with bands * rows == num_perm whose S-curve midpoint is closest to threshold."""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1.0 / br[0]) ** (1.0 / br[1]) - threshold))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        # a * x + b stays below 2**64 for 32-bit shingle hashes, so uint64 can't overflow
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def shingles(self, normalised: str) -> np.ndarray:
+        words = normalised.split(" ")
+        k = min(self.shingle_size, len(words))
+        grams = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, normalised: str) -> np.ndarray:
+        hashes = self.shingles(normalised)
+        return ((self.a * hashes[None, :] + self.b) % _MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+
+def _merge_sources(kept, dropped):
+    sources = kept.metadata.setdefault("sources", [kept.metadata["source"]] if kept.metadata.get("source") else [])
+    for source in dropped.metadata.get("sources") or [dropped.metadata.get("source")]:
+        if source and source not in sources:
+            sources.append(source)
+    kept.metadata["duplicates"] = kept.metadata.get("duplicates", 0) + 1
+
+
+def deduplicate(docs, threshold: float = 0.9, num_perm: int = 128, shingle_size: int = 3):
+    """Drop exact and near-duplicate Documents; returns (kept, stats).
+
+    threshold is the Jaccard similarity of word shingles at or above which two
+    chunks count as duplicates; 1.0 or more disables near-duplicate detection.
+    """
+    near = threshold < 1.0
+    hasher = MinHasher(num_perm, shingle_size) if near else None
+    bands, rows = _lsh_params(num_perm, threshold) if near else (0, 0)
+    buckets = [{} for _ in range(bands)]
+
+    kept, signatures = [], []
+    by_hash = {}
+    exact = near_dupes = 0
+
+    for doc in docs:
+        normalised = _normalise(doc.page_content)
+        digest = hashlib.blake2b(normalised.encode(), digest_size=16).digest()
+        if digest in by_hash:
+            _merge_sources(kept[by_hash[digest]], doc)
+            exact += 1
+            continue
+
+        if near and normalised:
+            signature = hasher.signature(normalised)
+            keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+            candidates = {i for band, key in enumerate(keys) for i in buckets[band].get(key, ())}
+            match = next(
+                (i for i in sorted(candidates) if np.mean(signatures[i] == signature) >= threshold),
+                None,
+            )
+            if match is not None:
+                _merge_sources(kept[match], doc)
+                by_hash[digest] = match
+                near_dupes += 1
+                continue
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, []).append(len(kept))
+        else:
+            signature = None
+
+        by_hash[digest] = len(kept)
+        kept.append(doc)
+        signatures.append(signature)
+
+    stats = {
+        "chunks": len(kept) + exact + near_dupes,
+        "kept": len(kept),
+        "exact_duplicates": exact,
+        "near_duplicates": near_dupes,
+        "vectors_saved": exact + near_dupes,
+    }
+    return kept, stats
+
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+    from html_extract import extract_page
+
+    contact = "<div class='contact'><p>Acme Widgets Ltd, 12 Harbour Road, Springfield</p><p>Call us on 555 0100, Monday to Friday</p></div>"
+    pages = {
+        "https://example.com/": f"<body><h1>Welcome</h1><p>{'We build widgets for every workshop. ' * 9}</p>{contact}</body>",
+        "https://example.com/pricing": f"<body><h1>Pricing</h1><p>{'Plans start at ten dollars a month. ' * 4}</p>{contact}</body>",
+    }
+    sources = [(url, extract_page(html, url).text) for url, html in pages.items()]
+    docs = [Document(page_content=chunk, metadata={"source": source}) for source, chunk in chunk_sources(sources)]
+    kept, stats = deduplicate(docs)
+    shared = [doc for doc in kept if "Harbour Road" in doc.page_content]
+    assert len(shared) == 1, f"contact block kept {len(shared)} times"
+    assert shared[0].metadata["sources"] == list(pages), shared[0].metadata
+    assert stats["exact_duplicates"] == 1, stats
+    print(f"ok: shared contact block embedded once for {len(pages)} pages; {stats}")
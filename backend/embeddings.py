@@ -0,0 +1,169 @@
+"""Process-wide embedding encoder and the LangChain embedding adapters built on it.
+
+Two interchangeable backends implement ``encode(texts) -> float32 array``: the
+PyTorch sentence-transformers model and an ONNX Runtime export of the same model
+(selected with EMBEDDING_BACKEND). Importing this module pulls in langchain_core;
+torch or onnxruntime are only imported when the encoder is first loaded.
+"""
+import os
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from batcher import EmbeddingBatcher
+from config import settings
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+_models = {}
+_models_lock = threading.RLock()
+
+def get_sentence_transformer(model_name: str = EMBEDDING_MODEL_NAME):
+    """Return the process-wide SentenceTransformer for model_name, loading it on first use.
+
+    Sharing one instance keeps a single copy of the weights per process, and lets
+    serve.py load it once in the parent so forked workers share it copy-on-write.
+    """
+    model = _models.get(model_name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(model_name)
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name)
+                _models[model_name] = model
+    return model
+
+
+class SentenceTransformerEncoder:
+    """Full-precision PyTorch encoder via sentence-transformers."""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+        self.model = get_sentence_transformer(model_name)
+
+    def encode(self, texts, batch_size: int = 64) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """all-MiniLM-L6-v2 exported to ONNX (see onnx_export.py), run on CPU with ONNX Runtime.
+
+    Reproduces the sentence-transformers pipeline for this model: transformer,
+    attention-masked mean pooling, then L2 normalisation.
+    """
+
+    backend = "onnx"
+    max_seq_length = 256
+
+    def __init__(self, model_dir: str, quantized: bool = True, model_name: str = EMBEDDING_MODEL_NAME, threads: int = 0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("The ONNX embedding backend requires onnxruntime and tokenizers") from e
+
+        self.model_name = model_name
+        self.quantized = quantized
+        model_file = os.path.join(model_dir, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(model_file):
+            raise RuntimeError(f"ONNX model not found at {model_file}; run onnx_export.py first")
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts, batch_size: int = 64) -> np.ndarray:
+        texts = list(texts)
+        out = []
+        for i in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[i:i + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32))
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(out)
+
+
+_encoder = None
+
+def get_encoder():
+    """Return the process-wide encoder for the configured embedding_backend."""
+    global _encoder
+    if _encoder is None:
+        with _models_lock:
+            if _encoder is None:
+                if settings.embedding_backend == "onnx":
+                    _encoder = OnnxEncoder(
+                        settings.onnx_model_dir,
+                        quantized=settings.onnx_quantized,
+                        threads=settings.onnx_threads,
+                    )
+                else:
+                    _encoder = SentenceTransformerEncoder()
+    return _encoder
+
+_query_batcher = None
+
+def get_query_batcher() -> EmbeddingBatcher:
+    """Return the batcher that coalesces concurrent query embeddings."""
+    global _query_batcher
+    if _query_batcher is None:
+        encoder = get_encoder()
+        with _models_lock:
+            if _query_batcher is None:
+                _query_batcher = EmbeddingBatcher(
+                    lambda texts: encoder.encode(texts, batch_size=len(texts)),
+                    max_batch_size=settings.embedding_batch_max_size,
+                    max_wait_ms=settings.embedding_batch_max_wait_ms,
+                )
+    return _query_batcher
+
+def encode_query(text: str) -> np.ndarray:
+    """Embed a single query, batched with concurrent queries when embedding_batching is on."""
+    if settings.embedding_batching:
+        return get_query_batcher().embed(text)
+    return get_encoder().encode([text])[0]
+
+
+class MySentenceTransformerEmbeddings(Embeddings):
+    """LangChain adapter over the configured encoder, returning lists."""
+
+    def __init__(self):
+        self.encoder = get_encoder()
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return encode_query(text).tolist()
+
+class CustomSentenceTransformerEmbeddings(Embeddings):
+    """LangChain adapter over the configured encoder, returning float32 arrays."""
+
+    def __init__(self):
+        self.encoder = get_encoder()
+
+    def embed_documents(self, texts):
+        return list(self.encoder.encode(texts))
+
+    def embed_query(self, text):
+        return encode_query(text)
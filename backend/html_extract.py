@@ -0,0 +1,293 @@
+"""
+Boilerplate-stripping text extraction for crawled HTML pages.
+
+One parse per page yields both the page's links (for the crawler, taken
+before anything is removed so navigation menus still lead somewhere) and
+its main-content text:
+
+1. Non-content elements (script, style and friends) are dropped.
+2. Layout elements are dropped too: nav, footer, aside, ARIA landmark roles
+   for navigation/banners, hidden elements, and anything with an id or class
+   name token marking it as a cookie banner, popup, sidebar, share bar and so
+   on. An element is kept anyway if it contains <main>, [role=main] or
+   <article>, or holds most of the page's text, since such markers also show
+   up on page-wide wrappers (e.g. <div class="site-content has-sidebar">).
+3. The main content is the page's <main>, [role=main] or largest <article>
+   when it has one; otherwise the body, with link-dense blocks (menus that
+   aren't marked up as <nav>) pruned.
+
+The text has one line per block element (paragraph, heading, list item and
+so on), which the chunker uses to keep repeated blocks in chunks of their
+own (see dedup.chunk_sources).
+
+lxml is used when installed, which is several times faster than
+BeautifulSoup's html.parser; BeautifulSoup remains the fallback.
+"""
+import re
+from urllib.parse import urljoin
+
+try:
+    import lxml.html as _lxml_html
+    from lxml.etree import ParserError as _LxmlParserError
+except ImportError:
+    _lxml_html = None
+
+NON_CONTENT_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed"}
+LAYOUT_TAGS = {"nav", "footer", "aside", "button", "select", "dialog"}
+DROP_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog", "alertdialog"}
+# Whole tokens of id/class names, split on "-" and "_": "cookie-banner" matches, "shared-layout" doesn't
+DROP_TOKENS = {
+    "cookie", "cookies", "consent", "gdpr", "newsletter", "popup", "modal", "sidebar",
+    "breadcrumb", "breadcrumbs", "share", "sharing", "social", "advert", "advertisement", "ads", "promo", "skip",
+}
+# State classes describe the page around them, not the element: "has-sidebar", "is-modal-open"
+MODIFIER_PREFIXES = {"has", "is", "with", "no"}
+_TOKEN_SEPARATORS = re.compile(r"[-_]")
+# Never dropped, whatever their classes say (e.g. Bootstrap's <body class="modal-open">)
+KEEP_TAGS = {"html", "body", "main", "article"}
+# A layout element holding more than this share of the page's text is kept
+MAIN_TEXT_SHARE = 0.5
+BLOCK_TAGS = {"div", "section", "ul", "ol", "table", "header"}
+# A block is pruned as a menu when most of its text is link text and little is left over
+LINK_DENSITY_THRESHOLD = 0.5
+LINK_BLOCK_MAX_PLAIN_CHARS = 200
+# Elements whose start and end break the text into lines
+LINE_BREAK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "h1", "h2", "h3", "h4", "h5", "h6",
+    "ul", "ol", "li", "dl", "dt", "dd", "table", "tr", "blockquote", "pre", "figure", "figcaption",
+    "form", "fieldset", "address", "hr", "br",
+}
+# Private-use character marking line breaks in the tree until the text is joined
+_LINE_BREAK = "\ue000"
+
+
+class ExtractedPage:
+    def __init__(self, text: str, links: list, title: str, raw_bytes: int, parser: str, main_content: str):
+        self.text = text
+        self.links = links
+        self.title = title
+        self.raw_bytes = raw_bytes
+        self.text_bytes = len(text.encode("utf-8"))
+        self.parser = parser
+        self.main_content = main_content  # How the main content was located
+
+    def stats(self) -> dict:
+        return {
+            "raw_bytes": self.raw_bytes,
+            "text_bytes": self.text_bytes,
+            "ratio": round(self.text_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+            "links": len(self.links),
+            "parser": self.parser,
+            "main_content": self.main_content,
+        }
+
+
+def _has_drop_token(names: str) -> bool:
+    for name in names.lower().split():
+        tokens = _TOKEN_SEPARATORS.split(name)
+        if tokens[0] in MODIFIER_PREFIXES:
+            continue
+        if any(token in DROP_TOKENS for token in tokens):
+            return True
+    return False
+
+
+def _boilerplate_kind(tag: str, get_attr):
+    """Classify an element as "non-content", "layout" (dropped unless it holds the content) or None."""
+    if tag in NON_CONTENT_TAGS:
+        return "non-content"
+    role = (get_attr("role") or "").lower()
+    if tag in KEEP_TAGS or role == "main":
+        return None
+    if tag in LAYOUT_TAGS or role in DROP_ROLES:
+        return "layout"
+    if get_attr("hidden") is not None or (get_attr("aria-hidden") or "").lower() == "true":
+        return "layout"
+    if _has_drop_token(f"{get_attr('id') or ''} {get_attr('class') or ''}"):
+        return "layout"
+    return None
+
+
+def _join_text(pieces) -> str:
+    return " ".join(piece.strip() for piece in pieces if piece and piece.strip())
+
+
+def _join_lines(pieces) -> str:
+    """Like _join_text, but with a newline wherever a _LINE_BREAK was inserted."""
+    lines = (" ".join(line.split()) for line in " ".join(pieces).split(_LINE_BREAK))
+    return "\n".join(line for line in lines if line)
+
+
+def _unique_links(hrefs, base_url: str) -> list:
+    seen = set()
+    links = []
+    for href in hrefs:
+        href = (href or "").strip()
+        if not href:
+            continue
+        absolute = urljoin(base_url, href)
+        if absolute not in seen:
+            seen.add(absolute)
+            links.append(absolute)
+    return links
+
+
+def _is_link_dense(text_len: int, link_text_len: int) -> bool:
+    return (
+        text_len > 0
+        and link_text_len / text_len > LINK_DENSITY_THRESHOLD
+        and text_len - link_text_len < LINK_BLOCK_MAX_PLAIN_CHARS
+    )
+
+
+# -- lxml --------------------------------------------------------------------
+
+def _lxml_text_len(element) -> int:
+    return sum(len(t.strip()) for t in element.itertext())
+
+
+def _lxml_parse(html):
+    if isinstance(html, bytes):
+        return _lxml_html.document_fromstring(html)
+    try:
+        return _lxml_html.document_fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return _lxml_html.document_fromstring(html.encode("utf-8"))
+
+
+def _extract_lxml(html, base_url: str):
+    try:
+        root = _lxml_parse(html)
+    except _LxmlParserError:
+        # "Document is empty": nothing but whitespace, comments or declarations
+        return "", [], "", "empty"
+
+    hrefs = []
+    non_content, layout = [], []
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            non_content.append(element)  # Comments and processing instructions
+            continue
+        if element.tag == "a":
+            hrefs.append(element.get("href"))
+        kind = _boilerplate_kind(element.tag, element.get)
+        if kind == "non-content":
+            non_content.append(element)
+        elif kind == "layout":
+            layout.append(element)
+
+    title_element = root.find(".//title")
+    title = _join_text(title_element.itertext()) if title_element is not None else ""
+
+    for element in non_content:
+        if element.getparent() is not None:
+            element.drop_tree()
+
+    body = root.find("body")
+    page_len = _lxml_text_len(body if body is not None else root)
+    for element in layout:
+        if element.getparent() is None:
+            continue
+        if element.xpath(".//main | .//article | .//*[@role='main']"):
+            continue
+        if _lxml_text_len(element) > MAIN_TEXT_SHARE * page_len:
+            continue
+        element.drop_tree()
+
+    main, how = None, "body"
+    mains = root.xpath("//main | //*[@role='main']")
+    if mains:
+        main, how = mains[0], "main"
+    else:
+        articles = root.xpath("//article")
+        if articles:
+            main, how = max(articles, key=_lxml_text_len), "article"
+    if main is None:
+        main = root.find("body")
+        if main is None:
+            main = root
+        for block in list(main.iter(*BLOCK_TAGS)):
+            text_len = _lxml_text_len(block)
+            link_len = sum(_lxml_text_len(a) for a in block.iter("a"))
+            if _is_link_dense(text_len, link_len):
+                block.drop_tree()
+                how = "body-pruned"
+
+    for element in main.iter(*LINE_BREAK_TAGS):
+        element.text = _LINE_BREAK + (element.text or "")
+        element.tail = _LINE_BREAK + (element.tail or "")
+    return _join_lines(main.itertext()), hrefs, title, how
+
+
+# -- BeautifulSoup fallback ---------------------------------------------------
+
+def _bs4_attr_getter(tag):
+    def get_attr(name):
+        value = tag.get(name)
+        # BeautifulSoup returns multi-valued attributes such as class as lists
+        return " ".join(value) if isinstance(value, list) else value
+    return get_attr
+
+
+def _extract_bs4(html, base_url: str):
+    from bs4 import BeautifulSoup, Comment
+
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = [a.get("href") for a in soup.find_all("a", href=True)]
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+
+    for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+    layout = []
+    for tag in soup.find_all(True):
+        if tag.decomposed:
+            continue
+        kind = _boilerplate_kind(tag.name, _bs4_attr_getter(tag))
+        if kind == "non-content":
+            tag.decompose()
+        elif kind == "layout":
+            layout.append(tag)
+
+    page_len = len((soup.body or soup).get_text(strip=True))
+    for tag in layout:
+        if tag.decomposed:
+            continue
+        if tag.find(["main", "article"]) or tag.find(attrs={"role": "main"}):
+            continue
+        if len(tag.get_text(strip=True)) > MAIN_TEXT_SHARE * page_len:
+            continue
+        tag.decompose()
+
+    main, how = soup.find("main") or soup.find(attrs={"role": "main"}), "main"
+    if main is None:
+        articles = soup.find_all("article")
+        if articles:
+            main, how = max(articles, key=lambda a: len(a.get_text(strip=True))), "article"
+    if main is None:
+        main, how = soup.body or soup, "body"
+        for block in main.find_all(list(BLOCK_TAGS)):
+            if block.decomposed:
+                continue
+            text_len = len(block.get_text(strip=True))
+            link_len = sum(len(a.get_text(strip=True)) for a in block.find_all("a"))
+            if _is_link_dense(text_len, link_len):
+                block.decompose()
+                how = "body-pruned"
+
+    for tag in main.find_all(list(LINE_BREAK_TAGS)):
+        tag.insert(0, _LINE_BREAK)
+        tag.insert_after(_LINE_BREAK)
+    return _join_lines([main.get_text(separator=" ", strip=True)]), hrefs, title, how
+
+
+def extract_page(html, base_url: str) -> ExtractedPage:
+    """Extract main-content text and absolute links from one HTML page (str or bytes)."""
+    raw_bytes = len(html) if isinstance(html, bytes) else len(html.encode("utf-8"))
+    if _lxml_html is not None:
+        text, hrefs, title, how = _extract_lxml(html, base_url)
+        parser = "lxml"
+    else:
+        text, hrefs, title, how = _extract_bs4(html, base_url)
+        parser = "html.parser"
+    return ExtractedPage(text, _unique_links(hrefs, base_url), title, raw_bytes, parser, how)
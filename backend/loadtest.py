@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Closed-loop load generator for the Botly API.
+
+Drives a running server across /auth/login, /query and /upload with a
+configurable request mix, at one or more concurrency levels, and reports
+throughput, latency percentiles and error rates per endpoint.
+
+Typical run against a single worker backed by the local OpenAI stub:
+    python openai_stub.py --port 9000 &
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 python start.py &
+    python loadtest.py --concurrency 1,4,16,32 --duration 30 --mix query=8,login=2,upload=1
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from batcher import percentile
+
+DEFAULT_MIX = "query=8,login=2,upload=1"
+QUESTIONS = [
+    "What does Botly do?",
+    "How much do the plans cost?",
+    "When is support available?",
+    "Can I ask unlimited questions?",
+]
+
+
+def minimal_pdf(text: str) -> bytes:
+    """Build a one-page PDF containing ``text`` without any PDF library."""
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+UPLOAD_PDF = minimal_pdf(
+    "Botly is a platform for building document-powered chatbots. "
+    "Plans start at ten dollars per month and include unlimited questions. "
+    "Support is available by email on weekdays from nine to five."
+)
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("query", "login", "upload"):
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Tenant:
+    """A registered user with one chatbot for queries and one for uploads."""
+
+    def __init__(self, email, password, user_id, query_chatbot_id, upload_chatbot_id):
+        self.email = email
+        self.password = password
+        self.user_id = user_id
+        self.query_chatbot_id = query_chatbot_id
+        self.upload_chatbot_id = upload_chatbot_id
+
+
+def setup_tenants(base_url, count, api_key, timeout):
+    """Register users, create chatbots and train the query chatbot once."""
+    tenants = []
+    session = requests.Session()
+    for _ in range(count):
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        response = session.post(f"{base_url}/auth/register", json={
+            "email": email, "password": password, "openai_api_key": api_key,
+        }, timeout=timeout)
+        response.raise_for_status()
+        user_id = response.json()["id"]
+
+        chatbot_ids = []
+        for name in ("loadtest-query", "loadtest-upload"):
+            response = session.post(f"{base_url}/create_chatbot", data={
+                "user_id": user_id, "chatbot_name": name,
+            }, timeout=timeout)
+            response.raise_for_status()
+            chatbot_ids.append(response.json()["chatbot_id"])
+
+        response = session.post(
+            f"{base_url}/upload",
+            data={"user_id": user_id, "chatbot_id": chatbot_ids[0]},
+            files={"file": ("loadtest.pdf", UPLOAD_PDF, "application/pdf")},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        tenants.append(Tenant(email, password, user_id, *chatbot_ids))
+    return tenants
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, latency, status_code, ok):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.status_codes[endpoint][status_code] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def send(session, base_url, endpoint, tenant, timeout):
+    if endpoint == "login":
+        return session.post(f"{base_url}/auth/login", json={
+            "email": tenant.email, "password": tenant.password,
+        }, timeout=timeout)
+    if endpoint == "query":
+        return session.post(f"{base_url}/query", data={
+            "user_id": tenant.user_id,
+            "chatbot_id": tenant.query_chatbot_id,
+            "question": random.choice(QUESTIONS),
+        }, timeout=timeout)
+    return session.post(
+        f"{base_url}/upload",
+        data={"user_id": tenant.user_id, "chatbot_id": tenant.upload_chatbot_id},
+        files={"file": ("loadtest.pdf", UPLOAD_PDF, "application/pdf")},
+        timeout=timeout,
+    )
+
+
+def is_success(endpoint, response):
+    if response.status_code != 200:
+        return False
+    if endpoint == "query":
+        # get_openai_answer reports LLM failures in-band rather than as an HTTP error
+        return not response.json().get("answer", "").startswith("❌")
+    return True
+
+
+def worker(base_url, tenants, weights, deadline, recorder, timeout):
+    session = requests.Session()
+    endpoints = list(weights)
+    endpoint_weights = [weights[e] for e in endpoints]
+    while time.perf_counter() < deadline:
+        endpoint = random.choices(endpoints, endpoint_weights)[0]
+        tenant = random.choice(tenants)
+        start = time.perf_counter()
+        try:
+            response = send(session, base_url, endpoint, tenant, timeout)
+            ok = is_success(endpoint, response)
+            status_code = response.status_code
+        except requests.RequestException:
+            ok = False
+            status_code = "conn-error"
+        recorder.record(endpoint, time.perf_counter() - start, status_code, ok)
+
+
+def run_level(base_url, tenants, weights, concurrency, duration, timeout):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker, base_url, tenants, weights, deadline, recorder, timeout)
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint, latencies in recorder.latencies.items():
+        latencies = sorted(latencies)
+        count = len(latencies)
+        errors = recorder.errors[endpoint]
+        results[endpoint] = {
+            "requests": count,
+            "throughput_rps": round((count - errors) / elapsed, 2),
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "status_codes": {str(k): v for k, v in recorder.status_codes[endpoint].items()},
+        }
+    return {"concurrency": concurrency, "elapsed_s": round(elapsed, 2), "endpoints": results}
+
+
+def print_level(level):
+    print(f"\n== concurrency {level['concurrency']} ({level['elapsed_s']}s) ==")
+    print(f"{'endpoint':<10}{'reqs':>8}{'ok rps':>10}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in sorted(level["endpoints"].items()):
+        print(
+            f"{endpoint:<10}{stats['requests']:>8}{stats['throughput_rps']:>10}"
+            f"{stats['error_rate'] * 100:>8.1f}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        )
+
+
+def check_thresholds(levels, max_p95, max_error_rate):
+    """Return a list of threshold violations across all concurrency levels."""
+    failures = []
+    for level in levels:
+        for endpoint, stats in level["endpoints"].items():
+            limit = max_p95.get(endpoint)
+            if limit is not None and stats["p95_ms"] > limit:
+                failures.append(f"{endpoint} p95 {stats['p95_ms']}ms > {limit}ms at concurrency {level['concurrency']}")
+            if max_error_rate is not None and stats["error_rate"] > max_error_rate:
+                failures.append(
+                    f"{endpoint} error rate {stats['error_rate']:.2%} > {max_error_rate:.2%} "
+                    f"at concurrency {level['concurrency']}"
+                )
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Botly API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels to step through")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run each concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. query=8,login=2,upload=1")
+    parser.add_argument("--tenants", type=int, default=4, help="Number of users/chatbots to spread load across")
+    parser.add_argument("--api-key", default="stub-key", help="OpenAI key stored on the test users")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the full results as JSON to this path")
+    parser.add_argument("--max-p95", default="", help="Fail if p95 exceeds these limits, e.g. query=2000,login=300")
+    parser.add_argument("--max-error-rate", type=float, help="Fail if any endpoint's error rate exceeds this fraction")
+    args = parser.parse_args(argv)
+
+    base_url = args.base_url.rstrip("/")
+    weights = parse_mix(args.mix)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    max_p95 = {}
+    for part in filter(None, args.max_p95.split(",")):
+        name, _, limit = part.partition("=")
+        max_p95[name.strip()] = float(limit)
+
+    print(f"Setting up {args.tenants} tenants against {base_url}...")
+    tenants = setup_tenants(base_url, args.tenants, args.api_key, args.timeout)
+
+    results = []
+    for concurrency in levels:
+        level = run_level(base_url, tenants, weights, concurrency, args.duration, args.timeout)
+        print_level(level)
+        results.append(level)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"base_url": base_url, "mix": weights, "levels": results}, f, indent=2)
+
+    failures = check_thresholds(results, max_p95, args.max_error_rate)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,35 @@
-from fastapi import FastAPI, UploadFile, Form, Depends, HTTPException, Request, status
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
+from typing import List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 import logging
 import os
 from config import settings
 from utils import (
-    extract_text_from_pdf, extract_text_from_website,
-    split_and_embed, load_vectorstore, get_openai_answer,
-    get_db, init_db
+    extract_sources, file_extension, split_and_embed_sources, get_openai_answer,
+    retrieve_for_questions, build_qa_chain,
+    get_db, init_db, SessionLocal
+)
+import warmup
+from ratelimit import (
+    query_rate_limiter, upload_rate_limiter, public_ip_rate_limiter, public_rate_limiter,
+    llm_admission, ingest_admission
 )
-from models import User, Chatbot, Analytics
-from schemas import UserRegister, UserLogin, UserResponse, UserUpdate, Token, ChatbotCreate, ChatbotUpdate, ChatbotResponse
+from public_sessions import public_bots, public_sessions
+from snapshot import SnapshotError, export_snapshot, import_snapshot
+from tiering import TieringManager
+import profiling
+from profiling import profiled
+from models import User, Chatbot, Analytics, DataSource
+from schemas import BatchQueryRequest, UserRegister, UserLogin, UserResponse, UserUpdate, Token, ChatbotCreate, ChatbotUpdate, ChatbotResponse, DataSourceResponse
 from auth import (
     get_password_hash, authenticate_user, create_access_token, 
     get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -45,10 +61,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling; not installed at all unless an admin token is configured
+if profiling.is_enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 UPLOAD_DIR = "storage"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+tiering = TieringManager(UPLOAD_DIR, settings.archive_dir)
 init_db()
 
+warmup.record_app_import(time.perf_counter() - _import_started)
+
+@app.on_event("startup")
+def warm_up_heavy_components():
+    """Load the ML, PDF and crawler stacks in the background so /health answers immediately.
+
+    Under serve.py the parent has already warmed up and this finishes almost instantly.
+    """
+    if settings.warmup_on_startup:
+        warmup.warm_up_in_background()
+
+@app.on_event("startup")
+def start_storage_tiering():
+    if settings.tiering_enabled:
+        tiering.start()
+
+@app.on_event("shutdown")
+def flush_public_session_activity():
+    public_sessions.flush()
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
 def register_user(user_data: UserRegister, db: Session = Depends(get_db)):
@@ -110,6 +151,7 @@ def update_current_user(
     
     db.commit()
     db.refresh(current_user)
+    public_bots.invalidate_user(current_user.id)
     return current_user
 
 # Legacy register endpoint for backward compatibility
@@ -194,6 +236,7 @@ def update_chatbot(
     chatbot.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(chatbot)
+    public_bots.invalidate(chatbot_id)
     return chatbot
 
 @app.post("/create_chatbot")
@@ -276,16 +319,200 @@ def delete_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
     # Delete chatbot
     db.delete(chatbot)
     db.commit()
+    public_bots.invalidate(chatbot_id)
+    public_sessions.forget_chatbot(chatbot_id)
     
     # Delete chatbot files
     user_dir = os.path.join(UPLOAD_DIR, str(chatbot.user_id), str(chatbot_id))
+    with tiering.exclusive(chatbot.user_id, chatbot_id):
+        if os.path.exists(user_dir):
+            import shutil
+            shutil.rmtree(user_dir)
+        tiering.drop_archive(chatbot.user_id, chatbot_id)
+    
+    return {"message": "Chatbot deleted successfully"}
+
+@app.get("/chatbots/{chatbot_id}/export")
+def export_chatbot(
+    chatbot_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download a chatbot's trained index and metadata as a single snapshot file."""
+    chatbot = db.query(Chatbot).filter(
+        Chatbot.id == chatbot_id,
+        Chatbot.user_id == current_user.id
+    ).first()
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+
+    user_dir = os.path.join(UPLOAD_DIR, str(current_user.id), str(chatbot_id))
+    with tiering.hydrated(current_user.id, chatbot_id):
+        try:
+            stream = export_snapshot(chatbot, user_dir)
+        except SnapshotError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+    def locked_stream():
+        # Keep the files from being archived while they are being streamed out
+        with tiering.hydrated(current_user.id, chatbot_id):
+            yield from stream
+
+    return StreamingResponse(
+        locked_stream(),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="chatbot-{chatbot_id}.botly"'}
+    )
+
+@app.post("/chatbots/import", response_model=ChatbotResponse)
+def import_chatbot(
+    file: UploadFile = File(...),
+    chatbot_id: int = Form(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Restore a snapshot without re-embedding.
+
+    Replaces the data of chatbot_id if given, otherwise creates a new chatbot from
+    the snapshot's metadata.
+    """
+    if chatbot_id is not None:
+        chatbot = db.query(Chatbot).filter(
+            Chatbot.id == chatbot_id,
+            Chatbot.user_id == current_user.id
+        ).first()
+        if not chatbot:
+            raise HTTPException(status_code=404, detail="Chatbot not found")
+    else:
+        chatbot = Chatbot(name="Imported chatbot", user_id=current_user.id)
+        db.add(chatbot)
+        db.flush()
+
+    user_dir = os.path.join(UPLOAD_DIR, str(current_user.id), str(chatbot.id))
+    try:
+        with ingest_admission.slot(), tiering.exclusive(current_user.id, chatbot.id):
+            manifest = import_snapshot(file.file, user_dir)
+            # Only now is the archived copy stale; a rejected snapshot must not cost it
+            tiering.drop_archive(current_user.id, chatbot.id)
+    except SnapshotError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    metadata = manifest["chatbot"]
+    if chatbot_id is None:
+        chatbot.name = metadata.get("name") or chatbot.name
+        chatbot.description = metadata.get("description")
+        chatbot.instructions = metadata.get("instructions")
+    chatbot.data_source = metadata.get("data_source")
+    chatbot.data_type = metadata.get("data_type")
+    chatbot.last_trained = datetime.fromisoformat(metadata["last_trained"]) if metadata.get("last_trained") else datetime.utcnow()
+    chatbot.has_data = True
+    chatbot.updated_at = datetime.utcnow()
+    db.query(DataSource).filter(DataSource.chatbot_id == chatbot.id).delete()
+    db.add_all([
+        DataSource(
+            chatbot_id=chatbot.id,
+            source=ds["source"],
+            source_type=ds["source_type"],
+            characters=ds.get("characters", 0),
+            error=ds.get("error")
+        )
+        for ds in metadata.get("sources", [])
+    ])
+    db.commit()
+    db.refresh(chatbot)
+    public_bots.invalidate(chatbot.id)
+    return chatbot
+
+def _validate_uploads(files: List[UploadFile]):
+    """Check every uploaded file's type, size and name before any existing data is touched."""
+    seen = set()
+    for file in files:
+        filename = os.path.basename(file.filename or "")
+        if file_extension(filename) not in settings.allowed_file_types_list:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported file type: {filename}. Allowed: {settings.allowed_file_types}"
+            )
+        if filename in seen:
+            raise HTTPException(status_code=400, detail=f"Duplicate file name in upload: {filename}")
+        seen.add(filename)
+
+        # The upload is already spooled, so its size is known without reading it
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+        if size > settings.max_file_size:
+            raise HTTPException(status_code=413, detail=f"File too large: {filename}")
+
+def _save_upload(file: UploadFile, user_dir: str) -> str:
+    """Write an upload that passed _validate_uploads into user_dir."""
+    file_path = os.path.join(user_dir, os.path.basename(file.filename))
+    with open(file_path, "wb") as f:
+        while chunk := file.file.read(1024 * 1024):
+            f.write(chunk)
+    return file_path
+
+def _ingest_sources(db: Session, chatbot: Chatbot, user_dir: str, file_paths: list, websites: list):
+    """Extract all sources in parallel, embed them in one pass and record each source.
+
+    Returns the DataSource records, the chunk dedup stats and the per-page crawl
+    stats of the websites.
+    """
+    results = extract_sources(file_paths, websites)
+    # Each crawled page is a source of its own, so chunks are attributed to (and chunked from) the page
+    texts = [(source, text) for r in results for source, text in r["parts"] if text.strip()]
+    if not texts:
+        errors = "; ".join(f"{r['source']}: {r['error']}" for r in results if r["error"])
+        raise HTTPException(status_code=400, detail=f"No text could be extracted. {errors}".strip())
+
+    dedup_stats = split_and_embed_sources(texts, user_dir)
+    logger.info(
+        f"Chatbot {chatbot.id}: embedded {dedup_stats['kept']} of {dedup_stats['chunks']} chunks "
+        f"({dedup_stats['exact_duplicates']} exact and {dedup_stats['near_duplicates']} near duplicates dropped, "
+        f"{dedup_stats['vector_bytes_saved']} vector bytes saved)"
+    )
+
+    db.query(DataSource).filter(DataSource.chatbot_id == chatbot.id).delete()
+    records = [
+        DataSource(
+            chatbot_id=chatbot.id,
+            source=r["source"],
+            source_type=r["source_type"],
+            characters=r["characters"],
+            error=r["error"]
+        )
+        for r in results
+    ]
+    db.add_all(records)
+
+    # Update chatbot data info
+    source_types = {r["source_type"] for r in results}
+    chatbot.data_source = results[0]["source"] if len(results) == 1 else f"{len(results)} sources"
+    chatbot.data_type = source_types.pop() if len(source_types) == 1 else "mixed"
+    chatbot.has_data = True
+    chatbot.last_trained = datetime.utcnow()
+    chatbot.updated_at = datetime.utcnow()
+    db.commit()
+    public_bots.invalidate(chatbot.id)
+    crawl = [{"website": r["source"], "pages": r["pages"]} for r in results if r["source_type"] == "website"]
+    return records, dedup_stats, crawl
+
+def _reset_chatbot_dir(user_id: int, chatbot_id: int) -> str:
+    """Wipe the chatbot's data for retraining; call inside tiering.writing()."""
+    user_dir = os.path.join(UPLOAD_DIR, str(user_id), str(chatbot_id))
+    tiering.discard(user_id, chatbot_id)
+
+    # Delete existing data if any
     if os.path.exists(user_dir):
         import shutil
         shutil.rmtree(user_dir)
-    
-    return {"message": "Chatbot deleted successfully"}
+
+    os.makedirs(user_dir, exist_ok=True)
+    return user_dir
 
 @app.post("/upload")
+@profiled(allocations=True)
 def upload(user_id: int = Form(...), chatbot_id: int = Form(...), file: UploadFile = None, website: str = Form(None), db: Session = Depends(get_db)):
     """Upload data to a chatbot."""
     user = db.query(User).filter(User.id == user_id).first()
@@ -296,69 +523,88 @@ def upload(user_id: int = Form(...), chatbot_id: int = Form(...), file: UploadFi
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
 
-    text = ""
-    user_dir = os.path.join(UPLOAD_DIR, str(user_id), str(chatbot_id))
-    
-    # Delete existing data if any
-    if os.path.exists(user_dir):
-        import shutil
-        shutil.rmtree(user_dir)
+    if not file and not website:
+        raise HTTPException(status_code=400, detail="No data provided")
+
+    _validate_uploads([file] if file else [])
+    upload_rate_limiter.check(user_id, chatbot_id)
+    with ingest_admission.slot(), tiering.writing(user_id, chatbot_id):
+        user_dir = _reset_chatbot_dir(user_id, chatbot_id)
+        file_paths = [_save_upload(file, user_dir)] if file else []
+        _, dedup_stats, crawl = _ingest_sources(db, chatbot, user_dir, file_paths, [website] if website else [])
     
-    os.makedirs(user_dir, exist_ok=True)
+    return {"message": "Data uploaded and embedded", "dedup": dedup_stats, "crawl": crawl}
+
+@app.post("/upload/batch")
+@profiled(allocations=True)
+def upload_batch(
+    user_id: int = Form(...),
+    chatbot_id: int = Form(...),
+    files: List[UploadFile] = File(None),
+    websites: List[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Train a chatbot on many files and websites in one request, replacing its existing data."""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id, Chatbot.user_id == user_id).first()
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
 
-    if file:
-        file_path = os.path.join(user_dir, file.filename)
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
-        text += extract_text_from_pdf(file_path)
-        
-        # Update chatbot data info
-        chatbot.data_source = file.filename
-        chatbot.data_type = "file"
-
-    if website:
-        text += extract_text_from_website(website)
-        
-        # Update chatbot data info
-        chatbot.data_source = website
-        chatbot.data_type = "website"
-
-    if not text:
+    files = [f for f in (files or []) if f.filename]
+    websites = [w.strip() for w in (websites or []) if w.strip()]
+    if not files and not websites:
         raise HTTPException(status_code=400, detail="No data provided")
 
-    split_and_embed(text, user_dir)
+    _validate_uploads(files)
+    upload_rate_limiter.check(user_id, chatbot_id)
+    with ingest_admission.slot(), tiering.writing(user_id, chatbot_id):
+        user_dir = _reset_chatbot_dir(user_id, chatbot_id)
+        file_paths = [_save_upload(f, user_dir) for f in files]
+        records, dedup_stats, crawl = _ingest_sources(db, chatbot, user_dir, file_paths, websites)
+
+    return {
+        "message": "Data uploaded and embedded",
+        "sources": [DataSourceResponse.model_validate(r) for r in records],
+        "dedup": dedup_stats,
+        "crawl": crawl
+    }
+
+@app.get("/chatbot/{chatbot_id}/sources", response_model=list[DataSourceResponse])
+def get_chatbot_sources(chatbot_id: int, db: Session = Depends(get_db)):
+    """List the sources a chatbot was last trained on."""
+    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+    return db.query(DataSource).filter(DataSource.chatbot_id == chatbot_id).all()
+
+def with_bot_context(question: str, chatbot: Chatbot) -> str:
+    """Prefix the question with the bot's identity and instructions."""
+    context_prefix = ""
     
-    # Update chatbot status
-    chatbot.has_data = True
-    chatbot.last_trained = datetime.utcnow()
-    chatbot.updated_at = datetime.utcnow()
-    db.commit()
+    if chatbot.description:
+        context_prefix += f"You are {chatbot.name}, {chatbot.description}. "
+    else:
+        context_prefix += f"You are {chatbot.name}, an AI assistant. "
+    
+    if chatbot.instructions:
+        context_prefix += f"Your instructions: {chatbot.instructions} "
     
-    return {"message": "Data uploaded and embedded"}
+    context_prefix += "Please answer the following question based on the provided context and your instructions: "
+    
+    return context_prefix + question
 
 def get_enhanced_openai_answer(question: str, user_dir: str, api_key: str, chatbot: Chatbot) -> str:
     """Enhanced version of get_openai_answer with bot context."""
     try:
-        # Add bot identity and context to the question
-        context_prefix = ""
-        
-        if chatbot.description:
-            context_prefix += f"You are {chatbot.name}, {chatbot.description}. "
-        else:
-            context_prefix += f"You are {chatbot.name}, an AI assistant. "
-        
-        if chatbot.instructions:
-            context_prefix += f"Your instructions: {chatbot.instructions} "
-        
-        context_prefix += "Please answer the following question based on the provided context and your instructions: "
-        
-        enhanced_question = context_prefix + question
-        
-        return get_openai_answer(enhanced_question, user_dir, api_key)
+        return get_openai_answer(with_bot_context(question, chatbot), user_dir, api_key)
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
 @app.post("/query")
+@profiled
 def query(user_id: int = Form(...), chatbot_id: int = Form(...), question: str = Form(...), db: Session = Depends(get_db)):
     """Query a chatbot."""
     user = db.query(User).filter(User.id == user_id).first()
@@ -369,15 +615,20 @@ def query(user_id: int = Form(...), chatbot_id: int = Form(...), question: str =
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
 
+    query_rate_limiter.check(user_id, chatbot_id)
     user_dir = os.path.join(UPLOAD_DIR, str(user_id), str(chatbot_id))
-    if not os.path.exists(user_dir):
-        raise HTTPException(status_code=404, detail="Chatbot data not found. Please upload some data first.")
-
-    try:
-        # Use enhanced answer function with bot context
-        answer = get_enhanced_openai_answer(question, user_dir, user.openai_api_key, chatbot)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+    with tiering.hydrated(user_id, chatbot_id) as available:
+        if not available:
+            raise HTTPException(status_code=404, detail="Chatbot data not found. Please upload some data first.")
+
+        try:
+            # Use enhanced answer function with bot context
+            with llm_admission.slot():
+                answer = get_enhanced_openai_answer(question, user_dir, user.openai_api_key, chatbot)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
 
     analytics = Analytics(user_id=user_id, chatbot_id=chatbot_id, question=question, answer=answer)
     db.add(analytics)
@@ -385,6 +636,142 @@ def query(user_id: int = Form(...), chatbot_id: int = Form(...), question: str =
 
     return {"answer": answer}
 
+@app.post("/query/batch")
+@profiled
+def query_batch(request: BatchQueryRequest, db: Session = Depends(get_db)):
+    """Answer many questions against one chatbot.
+
+    Questions are embedded and searched as one batch, LLM calls run with bounded
+    concurrency, and results stream back as NDJSON lines in completion order:
+    {"index": i, "question": ..., "answer": ...} or {"index": i, "question": ..., "error": ...}.
+    """
+    questions = request.questions
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    # Each question is charged in full against the /query rate limit, so a batch
+    # can't be bigger than the limit's bucket
+    max_questions = min(settings.batch_query_max_questions, query_rate_limiter.max_cost())
+    if len(questions) > max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions; the maximum per batch is {int(max_questions)}",
+        )
+
+    user = db.query(User).filter(User.id == request.user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    chatbot = db.query(Chatbot).filter(Chatbot.id == request.chatbot_id, Chatbot.user_id == user.id).first()
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+
+    query_rate_limiter.check(user.id, chatbot.id, cost=len(questions))
+    user_id, chatbot_id, api_key = user.id, chatbot.id, user.openai_api_key
+    prompts = [with_bot_context(question, chatbot) for question in questions]
+
+    # Retrieval only needs the index while loading it, so hydration isn't held while streaming
+    user_dir = os.path.join(UPLOAD_DIR, str(user_id), str(chatbot_id))
+    with tiering.hydrated(user_id, chatbot_id) as available:
+        if not available:
+            raise HTTPException(status_code=404, detail="Chatbot data not found. Please upload some data first.")
+        try:
+            documents = retrieve_for_questions(prompts, user_dir)
+            chain = build_qa_chain(api_key)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error retrieving context: {str(e)}")
+
+    def answer(index: int) -> str:
+        # The executor already bounds this batch's concurrency; wait for a slot rather than fail under load
+        with llm_admission.slot(wait=True):
+            result = chain.invoke({"input_documents": documents[index], "question": prompts[index]})
+        return result["output_text"]
+
+    def results():
+        answered = []
+        pool = ThreadPoolExecutor(
+            max_workers=min(settings.batch_query_concurrency, len(questions)),
+            thread_name_prefix="batch-query",
+        )
+        try:
+            futures = {pool.submit(answer, index): index for index in range(len(questions))}
+            for future in as_completed(futures):
+                index = futures[future]
+                line = {"index": index, "question": questions[index]}
+                try:
+                    line["answer"] = future.result()
+                    answered.append(line)
+                except HTTPException as e:
+                    line["error"] = e.detail
+                except Exception as e:
+                    line["error"] = f"Error generating answer: {str(e)}"
+                yield json.dumps(line) + "\n"
+        finally:
+            # Also reached when the client disconnects; don't start unsent questions
+            pool.shutdown(wait=False, cancel_futures=True)
+            if answered:
+                analytics_db = SessionLocal()
+                try:
+                    analytics_db.bulk_save_objects([
+                        Analytics(user_id=user_id, chatbot_id=chatbot_id, question=line["question"], answer=line["answer"])
+                        for line in answered
+                    ])
+                    analytics_db.commit()
+                finally:
+                    analytics_db.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/public/chatbots/{chatbot_id}/query")
+@profiled
+def public_query(
+    chatbot_id: int,
+    request: Request,
+    question: str = Form(...),
+    session_id: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Query a public chatbot anonymously, e.g. from an embedded widget.
+
+    Pass back the returned session_id on later messages to keep the conversation's session.
+    """
+    chatbot = public_bots.get(db, chatbot_id)
+    if not chatbot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+
+    if not chatbot.has_data:
+        raise HTTPException(status_code=404, detail="This chatbot has not been trained yet.")
+
+    # Limit before touching the session: an unknown session_id creates a row.
+    # Behind a local reverse proxy, uvicorn resolves the client from X-Forwarded-For.
+    public_sessions.validate(session_id)
+    client_ip = request.client.host if request.client else "unknown"
+    public_ip_rate_limiter.check(client_ip, chatbot_id)
+    if session_id:
+        public_rate_limiter.check(session_id)
+
+    session_id = public_sessions.touch(db, session_id, chatbot_id)
+
+    user_dir = os.path.join(UPLOAD_DIR, str(chatbot.user_id), str(chatbot_id))
+    with tiering.hydrated(chatbot.user_id, chatbot_id) as available:
+        if not available:
+            raise HTTPException(status_code=404, detail="This chatbot has not been trained yet.")
+
+        try:
+            with llm_admission.slot():
+                answer = get_enhanced_openai_answer(question, user_dir, chatbot.openai_api_key, chatbot)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+
+    analytics = Analytics(
+        user_id=chatbot.user_id, chatbot_id=chatbot_id, question=question, answer=answer, session_id=session_id
+    )
+    db.add(analytics)
+    db.commit()
+
+    return {"answer": answer, "session_id": session_id}
+
 @app.get("/analytics")
 def get_analytics(user_id: int, chatbot_id: int, db: Session = Depends(get_db)):
     """Get analytics for a chatbot."""
@@ -412,12 +799,70 @@ def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/ready")
+def readiness_check():
+    """Per-worker readiness: ready once this process has loaded the embedding model (see warmup.is_ready)."""
+    ready = warmup.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "warming_up",
+            "worker_id": os.environ.get("BOTLY_WORKER_ID"),
+            "pid": os.getpid()
+        }
+    )
+
+@app.get("/startup-report")
+def startup_report():
+    """Import and warm-up time per component for this worker."""
+    return {"worker_id": os.environ.get("BOTLY_WORKER_ID"), **warmup.get_report()}
+
+@app.get("/metrics/embedding-batcher")
+def embedding_batcher_metrics():
+    """Batch-size and queue-wait metrics of the query embedding batcher in this worker."""
+    from embeddings import get_query_batcher
+    return {
+        "enabled": settings.embedding_batching,
+        "worker_id": os.environ.get("BOTLY_WORKER_ID"),
+        **(get_query_batcher().stats() if settings.embedding_batching else {})
+    }
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    """In-flight, queued and rejected counts for the LLM and ingestion caps in this worker."""
+    return {
+        "worker_id": os.environ.get("BOTLY_WORKER_ID"),
+        "llm": llm_admission.stats(),
+        "ingest": ingest_admission.stats()
+    }
+
+@app.get("/metrics/tiering")
+def tiering_metrics():
+    """Hot/archive storage usage, archive counts and rehydration latency for this node."""
+    return {"worker_id": os.environ.get("BOTLY_WORKER_ID"), **tiering.stats()}
+
+@app.get("/admin/profiles", dependencies=[Depends(profiling.require_admin)])
+def list_profiles():
+    """Stored request profiles on this node, newest first."""
+    return {"profiles": profiling.store.list()}
+
+@app.get("/admin/profiles/{request_id}", dependencies=[Depends(profiling.require_admin)])
+def get_profile(request_id: str, format: str = "json"):
+    """A stored request profile; format=collapsed returns flamegraph-ready folded stacks."""
+    profile = profiling.store.get(request_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse("".join(f"{stack} {count}\n" for stack, count in profile["collapsed"].items()))
+    return profile
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail, "status_code": exc.status_code}
+        content={"detail": exc.detail, "status_code": exc.status_code},
+        headers=exc.headers
     )
 
 @app.exception_handler(Exception)
@@ -43,6 +43,7 @@ class Chatbot(Base):
     user = relationship("User", back_populates="chatbots")
     analytics = relationship("Analytics", back_populates="chatbot", cascade="all, delete-orphan")
     public_sessions = relationship("PublicSession", back_populates="chatbot", cascade="all, delete-orphan")
+    data_sources = relationship("DataSource", back_populates="chatbot", cascade="all, delete-orphan")
 
 class Analytics(Base):
     __tablename__ = "analytics"
@@ -69,4 +70,18 @@ class PublicSession(Base):
     last_activity = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
-    chatbot = relationship("Chatbot", back_populates="public_sessions")
\ No newline at end of file
+    chatbot = relationship("Chatbot", back_populates="public_sessions")
+
+class DataSource(Base):
+    __tablename__ = "data_sources"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    chatbot_id = Column(Integer, ForeignKey("chatbots.id"), nullable=False, index=True)
+    source = Column(String(500), nullable=False)  # File name or website URL
+    source_type = Column(String(50), nullable=False)  # 'file' or 'website'
+    characters = Column(Integer, default=0)  # Extracted text length
+    error = Column(Text, nullable=True)  # Why extraction failed, if it did
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    chatbot = relationship("Chatbot", back_populates="data_sources")
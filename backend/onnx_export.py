@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Export all-MiniLM-L6-v2 to ONNX for the ONNX Runtime embedding backend, and
+compare it against the PyTorch backend.
+
+Usage:
+    python onnx_export.py export            # writes model.onnx, model.int8.onnx, tokenizer.json
+    python onnx_export.py check             # vector parity + throughput vs. PyTorch
+    EMBEDDING_BACKEND=onnx python start.py  # serve with the quantized ONNX encoder
+
+Needs torch, sentence-transformers, onnx and onnxruntime; only onnxruntime and
+tokenizers are needed at serving time.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import settings
+from embeddings import EMBEDDING_MODEL_NAME, OnnxEncoder, SentenceTransformerEncoder
+
+SAMPLE_TEXTS = [
+    "What are your opening hours?",
+    "How do I reset my password?",
+    "Botly lets you build chatbots that answer questions from your own documents.",
+    "Refunds are processed within five to seven business days after we receive the returned item.",
+    "The API is rate limited to sixty requests per minute per user.",
+    "Upload a PDF or point the crawler at your website to train the chatbot.",
+    "Our support team is available by email on weekdays from nine to five.",
+    "Plans start at ten dollars per month and include unlimited questions.",
+]
+
+
+def export(model_dir: str, opset: int = 14):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    dummy = tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(model_dir)
+    print(f"Exported {fp32_path}")
+
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Quantized {int8_path}")
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def nearest_neighbours(vectors: np.ndarray) -> np.ndarray:
+    """Index of each vector's most similar other vector, as a retrieval-level parity check."""
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, -np.inf)
+    return similarity.argmax(axis=1)
+
+
+def throughput(encoder, texts, batch_size: int, rounds: int) -> float:
+    encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        encoder.encode(texts, batch_size=batch_size)
+    return rounds * len(texts) / (time.perf_counter() - started)
+
+
+def check(model_dir: str, batch_size: int, rounds: int, min_similarity: float) -> int:
+    texts = SAMPLE_TEXTS * 16
+    reference = SentenceTransformerEncoder()
+    candidates = {"onnx-fp32": OnnxEncoder(model_dir, quantized=False)}
+    if os.path.exists(os.path.join(model_dir, "model.int8.onnx")):
+        candidates["onnx-int8"] = OnnxEncoder(model_dir, quantized=True)
+
+    ref_vectors = reference.encode(SAMPLE_TEXTS)
+    ref_top1 = nearest_neighbours(ref_vectors)
+    failed = False
+
+    print(f"{'backend':<12}{'min cos':>10}{'mean cos':>10}{'top-1 agree':>13}{'texts/s':>10}{'speedup':>9}")
+    ref_rate = throughput(reference, texts, batch_size, rounds)
+    print(f"{'torch':<12}{1.0:>10.4f}{1.0:>10.4f}{'100%':>13}{ref_rate:>10.1f}{1.0:>8.2f}x")
+
+    for name, encoder in candidates.items():
+        vectors = encoder.encode(SAMPLE_TEXTS)
+        similarity = cosine_rows(ref_vectors, vectors)
+        top1 = nearest_neighbours(vectors)
+        agreement = float((top1 == ref_top1).mean())
+        rate = throughput(encoder, texts, batch_size, rounds)
+        print(
+            f"{name:<12}{similarity.min():>10.4f}{similarity.mean():>10.4f}"
+            f"{agreement:>12.0%}{rate:>10.1f}{rate / ref_rate:>8.2f}x"
+        )
+        if similarity.min() < min_similarity:
+            print(f"FAIL: {name} minimum cosine similarity {similarity.min():.4f} < {min_similarity}")
+            failed = True
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and validate the ONNX embedding backend")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--model-dir", default=settings.onnx_model_dir)
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-similarity", type=float, default=0.98)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export(args.model_dir, args.opset)
+        return 0
+    return check(args.model_dir, args.batch_size, args.rounds, args.min_similarity)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for load testing.
+
+Serves just enough of the OpenAI API for ChatOpenAI to work against it, with
+tunable time-to-first-token and token rate, plus a tiny static page that the
+website crawler can ingest.
+
+Usage:
+    python openai_stub.py --port 9000 --latency-ms 300 --tokens-per-sec 50
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 python start.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOREM = (
+    "Botly answers questions using the documents that were uploaded for this "
+    "chatbot and keeps the reply short and to the point"
+).split()
+
+SITE_PAGE = """<!DOCTYPE html>
+<html><head><title>Botly load test</title></head>
+<body><main>
+<h1>Botly load test page</h1>
+<p>Botly is a platform for building document-powered chatbots.</p>
+<p>Plans start at ten dollars per month and include unlimited questions.</p>
+<p>Support is available by email on weekdays from nine to five.</p>
+</main></body></html>
+"""
+
+
+class StubConfig:
+    def __init__(self, latency_ms=300, jitter_ms=50, tokens_per_sec=50.0, completion_tokens=40, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def enter(self):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+def make_handler(config: StubConfig, stats: StubStats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/site"):
+                body = SITE_PAGE.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == "/v1/models":
+                self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+            elif self.path == "/stats":
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length) if length else b"{}"
+            if self.path != "/v1/chat/completions":
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+
+            stats.enter()
+            try:
+                request = json.loads(raw or b"{}")
+                if config.error_rate and random.random() < config.error_rate:
+                    self._send_json(500, {"error": {"message": "Injected stub error", "type": "server_error"}})
+                    return
+
+                latency = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+                time.sleep(latency)
+
+                tokens = [random.choice(LOREM) for _ in range(config.completion_tokens)]
+                per_token = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+                model = request.get("model", "gpt-4o-mini")
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                if request.get("stream"):
+                    self._stream(completion_id, model, tokens, per_token)
+                else:
+                    time.sleep(per_token * len(tokens))
+                    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+                    self._send_json(200, {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": " ".join(tokens)},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": len(tokens),
+                            "total_tokens": prompt_tokens + len(tokens),
+                        },
+                    })
+            finally:
+                stats.leave()
+
+        def _stream(self, completion_id, model, tokens, per_token):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_event(payload):
+                data = f"data: {payload}\n\n".encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for i, token in enumerate(tokens):
+                time.sleep(per_token)
+                write_event(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": token if i == 0 else " " + token},
+                        "finish_reason": None,
+                    }],
+                }))
+            write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=9000, config: StubConfig = None):
+    config = config or StubConfig()
+    stats = StubStats()
+    server = ThreadingHTTPServer((host, port), make_handler(config, stats))
+    server.daemon_threads = True
+    return server, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    args = parser.parse_args()
+
+    server, _ = serve(args.host, args.port, StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+    ))
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1")
+    print(f"Crawlable test page at http://{args.host}:{args.port}/site")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStub stopped by user")
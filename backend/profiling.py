@@ -0,0 +1,351 @@
+"""
+Opt-in per-request profiling for diagnosing slow requests in production.
+
+Only active when PROFILING_ADMIN_TOKEN is set; otherwise the middleware is
+never installed and @profiled endpoints run their handler directly. With a
+token configured, a request is profiled when it carries
+"X-Botly-Profile: <token>" or is picked by PROFILING_SAMPLE_RATE.
+
+A profiled request gets a stack-sampling profile of its handler thread
+(sys._current_frames every PROFILING_INTERVAL_MS, aggregated into collapsed
+stacks that flamegraph tools read directly). Endpoints decorated with
+@profiled(allocations=True) also record tracemalloc allocation statistics.
+Profiles are written to PROFILING_DIR under the request id, returned in the
+X-Request-ID response header, so any worker can serve them afterwards from
+/admin/profiles.
+"""
+import functools
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi import Header, HTTPException, status
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-botly-profile"
+REQUEST_ID_HEADER = "x-request-id"
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_current_profile: ContextVar = ContextVar("current_profile", default=None)
+
+
+def is_enabled() -> bool:
+    return bool(settings.profiling_admin_token)
+
+
+def _token_matches(value: str) -> bool:
+    return bool(value) and hmac.compare_digest(value.encode(), settings.profiling_admin_token.encode())
+
+
+class RequestProfile:
+    def __init__(self, request_id: str, method: str, path: str, reason: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.created_at = datetime.utcnow()
+        self.interval_ms = settings.profiling_interval_ms
+        self.stacks = Counter()
+        self.samples = 0
+        self.handler = None
+        self.handler_ms = None
+        self.total_ms = None
+        self.status_code = None
+        self.allocations = None
+
+    def add_stack(self, stack: tuple):
+        self.stacks[stack] += 1
+        self.samples += 1
+
+    def to_dict(self) -> dict:
+        self_time = Counter()
+        for stack, count in self.stacks.items():
+            self_time[stack[-1]] += count
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "created_at": self.created_at.isoformat(),
+            "status_code": self.status_code,
+            "handler": self.handler,
+            "handler_ms": self.handler_ms,
+            "total_ms": self.total_ms,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "top_self": [
+                {"frame": frame, "samples": count, "percent": round(100.0 * count / self.samples, 1)}
+                for frame, count in self_time.most_common(25)
+            ],
+            "collapsed": {";".join(stack): count for stack, count in self.stacks.most_common()},
+            "allocations": self.allocations,
+        }
+
+
+class StackSampler:
+    """One background thread sampling the stacks of the threads registered with it."""
+
+    def __init__(self):
+        self._targets = {}  # thread id -> (RequestProfile, code object the stack stops at)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def add(self, thread_id: int, profile: RequestProfile, root_code):
+        self._ensure_thread()
+        with self._lock:
+            self._targets[thread_id] = (profile, root_code)
+            self._wakeup.set()
+
+    def remove(self, thread_id: int):
+        with self._lock:
+            self._targets.pop(thread_id, None)
+
+    def _ensure_thread(self):
+        # Threads do not survive fork; start one per worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._targets = {}
+                threading.Thread(target=self._run, name="profile-sampler", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(settings.profiling_interval_ms / 1000.0)
+            with self._lock:
+                targets = dict(self._targets)
+                if not targets:
+                    self._wakeup.clear()
+                    continue
+            frames = sys._current_frames()
+            for thread_id, (profile, root_code) in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.add_stack(_stack(frame, root_code))
+
+
+def _stack(frame, root_code) -> tuple:
+    """Root-first frame labels, stopping at the profiled handler's wrapper."""
+    labels = []
+    while frame is not None and frame.f_code is not root_code:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class AllocationTracker:
+    """Reference-counted tracemalloc so concurrent ingestion profiles can overlap."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0
+        self._started_tracing = False
+
+    def start(self):
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(settings.profiling_traceback_depth)
+                self._started_tracing = True
+            self._users += 1
+            concurrent = self._users > 1
+        return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[0], concurrent
+
+    def stop(self, baseline, baseline_current: int, concurrent: bool) -> dict:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self._users -= 1
+            concurrent = concurrent or self._users > 0
+            if self._users == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+        top = snapshot.compare_to(baseline, "lineno")[:settings.profiling_top_allocations]
+        return {
+            "net_bytes": current - baseline_current,
+            "process_peak_bytes": peak,
+            # tracemalloc is process-wide; other requests' allocations show up here too
+            "overlapping_requests": concurrent,
+            "top": [
+                {
+                    "location": str(stat.traceback[0]) if stat.traceback else "?",
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in top
+            ],
+        }
+
+
+class ProfileStore:
+    """Profiles as JSON files, so every worker on the node can serve any of them."""
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, request_id: str) -> str:
+        return os.path.join(self.directory, f"{request_id}.json")
+
+    def save(self, profile: RequestProfile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile.request_id)
+        tmp = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp, "w") as f:
+            json.dump(profile.to_dict(), f)
+        os.rename(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        entries = self._entries()
+        for _, name in entries[:max(0, len(entries) - self.max_profiles)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _entries(self):
+        """(mtime, filename) of stored profiles, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+                except OSError:
+                    pass
+        return sorted(entries)
+
+    def get(self, request_id: str):
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            return None
+        try:
+            with open(self._path(request_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list:
+        summaries = []
+        for _, name in reversed(self._entries()):
+            profile = self.get(name[:-len(".json")])
+            if profile:
+                summaries.append({key: profile[key] for key in (
+                    "request_id", "method", "path", "reason", "created_at",
+                    "status_code", "handler", "handler_ms", "total_ms", "samples",
+                )})
+        return summaries
+
+
+sampler = StackSampler()
+allocation_tracker = AllocationTracker()
+store = ProfileStore(settings.profiling_dir, settings.profiling_max_profiles)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: requests that aren't profiled pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if _token_matches(headers.get(PROFILE_HEADER.encode(), b"").decode("latin-1")):
+            reason = "header"
+        elif settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate:
+            reason = "sampled"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        if not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        profile = RequestProfile(request_id, scope["method"], scope["path"], reason)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode()),
+                ]}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current_profile.reset(token)
+            profile.total_ms = round((time.perf_counter() - started) * 1000, 1)
+            # Only requests that reached a @profiled handler have anything worth keeping
+            if profile.handler:
+                try:
+                    store.save(profile)
+                except OSError as e:
+                    logger.error(f"Failed to save profile {request_id}: {e}")
+
+
+def profiled(func=None, *, allocations: bool = False):
+    """Profile a sync endpoint's handler when its request was selected for profiling.
+
+    The handler runs in a threadpool thread, which inherits the request's
+    context, so the profile set by the middleware is visible here.
+    """
+    if func is None:
+        return functools.partial(profiled, allocations=allocations)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+
+        profile.handler = func.__name__
+        thread_id = threading.get_ident()
+        if allocations:
+            baseline = allocation_tracker.start()
+        sampler.add(thread_id, profile, wrapper.__code__)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.handler_ms = round((time.perf_counter() - started) * 1000, 1)
+            sampler.remove(thread_id)
+            if allocations:
+                profile.allocations = allocation_tracker.stop(*baseline)
+
+    return wrapper
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Dependency gating the /admin/profiles endpoints on PROFILING_ADMIN_TOKEN."""
+    if not is_enabled():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is not enabled")
+    if not _token_matches(x_admin_token or ""):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
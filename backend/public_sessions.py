@@ -0,0 +1,185 @@
+"""
+Caches behind the anonymous public chatbot endpoint.
+
+Widget traffic is many small requests from many sessions, so the hot path
+avoids per-message DB work where it can:
+- PublicBotCache keeps a TTL'd snapshot of each public chatbot (and its
+  owner's API key), including negative entries for bots that aren't public.
+- SessionTracker remembers known sessions and buffers their last_activity
+  timestamps, writing them back in bulk from a background thread.
+
+Both caches are per worker; TTLs bound how long another worker can serve a
+stale snapshot after a chatbot is edited.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import SessionLocal
+from models import Chatbot, PublicSession, User
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSION_ID_LENGTH = 255  # PublicSession.session_id column size
+
+
+class PublicBot:
+    """Detached snapshot of what answering a public query needs from Chatbot and User."""
+
+    __slots__ = ("id", "user_id", "name", "description", "instructions", "has_data", "openai_api_key")
+
+    def __init__(self, chatbot: Chatbot, openai_api_key: str):
+        self.id = chatbot.id
+        self.user_id = chatbot.user_id
+        self.name = chatbot.name
+        self.description = chatbot.description
+        self.instructions = chatbot.instructions
+        self.has_data = chatbot.has_data
+        self.openai_api_key = openai_api_key
+
+
+class PublicBotCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db, chatbot_id: int):
+        """Return the PublicBot for chatbot_id, or None if it doesn't exist or isn't public."""
+        now = time.monotonic()
+        entry = self._entries.get(chatbot_id)
+        if entry and entry[1] > now:
+            return entry[0]
+
+        row = (
+            db.query(Chatbot, User.openai_api_key)
+            .join(User, Chatbot.user_id == User.id)
+            .filter(Chatbot.id == chatbot_id, Chatbot.is_public == True, User.is_active == True)
+            .first()
+        )
+        bot = PublicBot(row[0], row[1]) if row else None
+        with self._lock:
+            self._entries[chatbot_id] = (bot, now + self.ttl)
+        return bot
+
+    def invalidate(self, chatbot_id: int):
+        with self._lock:
+            self._entries.pop(chatbot_id, None)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for chatbot_id, (bot, _) in list(self._entries.items()):
+                if bot is not None and bot.user_id == user_id:
+                    del self._entries[chatbot_id]
+
+
+class SessionTracker:
+    def __init__(self, max_sessions: int, flush_interval: float):
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self._known = OrderedDict()  # session_id -> (row id, chatbot_id)
+        self._pending = {}  # row id -> last activity
+        self._lock = threading.Lock()
+        self._pid = None
+
+    @staticmethod
+    def validate(session_id: str):
+        """Reject client-supplied session ids that can't be stored (or used as rate limit keys)."""
+        if session_id and len(session_id) > MAX_SESSION_ID_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid session_id")
+
+    def touch(self, db, session_id: str, chatbot_id: int) -> str:
+        """Resolve or create the session and record activity; returns the session_id to use."""
+        self.validate(session_id)
+        if not session_id:
+            session_id = uuid.uuid4().hex
+
+        with self._lock:
+            known = self._known.get(session_id)
+            if known:
+                self._known.move_to_end(session_id)
+
+        if known is None:
+            known = self._load_or_create(db, session_id, chatbot_id)
+            with self._lock:
+                self._known[session_id] = known
+                while len(self._known) > self.max_sessions:
+                    self._known.popitem(last=False)
+
+        row_id, session_chatbot_id = known
+        if session_chatbot_id != chatbot_id:
+            raise HTTPException(status_code=400, detail="Session belongs to a different chatbot")
+
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[row_id] = datetime.utcnow()
+        return session_id
+
+    def _load_or_create(self, db, session_id: str, chatbot_id: int):
+        session = db.query(PublicSession).filter(PublicSession.session_id == session_id).first()
+        if session is None:
+            session = PublicSession(session_id=session_id, chatbot_id=chatbot_id)
+            db.add(session)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker created it concurrently
+                db.rollback()
+                session = db.query(PublicSession).filter(PublicSession.session_id == session_id).one()
+        return session.id, session.chatbot_id
+
+    def _ensure_flusher(self):
+        # Threads do not survive fork; start one per worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pending = {}
+                threading.Thread(target=self._flush_loop, name="public-session-flusher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush public session activity: {e}")
+
+    def flush(self):
+        """Write buffered last_activity timestamps in one bulk update."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        db = SessionLocal()
+        try:
+            db.bulk_update_mappings(
+                PublicSession,
+                [{"id": row_id, "last_activity": last_activity} for row_id, last_activity in pending.items()]
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def forget_chatbot(self, chatbot_id: int):
+        with self._lock:
+            for session_id, (row_id, session_chatbot_id) in list(self._known.items()):
+                if session_chatbot_id == chatbot_id:
+                    del self._known[session_id]
+                    self._pending.pop(row_id, None)
+
+
+public_bots = PublicBotCache(ttl=settings.public_bot_cache_ttl)
+public_sessions = SessionTracker(
+    max_sessions=settings.public_session_cache_size,
+    flush_interval=settings.public_session_flush_interval,
+)
@@ -0,0 +1,266 @@
+"""
+Per-tenant rate limiting and admission control.
+
+- Token buckets per user and per chatbot reject bursts beyond the configured
+  rate with 429 and a Retry-After header. Buckets live in memory by default;
+  RATE_LIMIT_BACKEND=redis shares them across workers and nodes.
+- AdmissionController caps in-flight LLM calls and ingestion jobs in this
+  worker, with a short bounded wait queue; anything beyond that gets an
+  immediate 503 with Retry-After instead of piling up.
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException, status
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InMemoryBucketBackend:
+    """Token buckets held in this process."""
+
+    max_buckets = 100000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        """Take cost tokens from the bucket; return 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, 0))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now, (capacity - tokens) / rate)
+            if len(self._buckets) > self.max_buckets:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < v[2]}
+
+
+class RedisBucketBackend:
+    """Token buckets in Redis, shared by every worker and node using the same Redis.
+
+    While Redis is unreachable, limits fall back to per-worker in-memory buckets
+    rather than failing requests.
+    """
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, prefix: str = "botly:ratelimit:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the redis package") from e
+        self._errors = (redis.RedisError,)
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+        self._fallback = InMemoryBucketBackend()
+        self._failing = False
+
+    def take(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> float:
+        try:
+            wait = float(self._script(keys=[self.prefix + key], args=[rate, capacity, cost]))
+        except self._errors as e:
+            if not self._failing:
+                logger.error(f"Redis rate limit backend unavailable, using in-memory buckets: {e}")
+                self._failing = True
+            return self._fallback.take(key, rate, capacity, cost)
+        if self._failing:
+            logger.info("Redis rate limit backend recovered")
+            self._failing = False
+        return wait
+
+
+def create_bucket_backend():
+    if settings.rate_limit_backend == "redis":
+        return RedisBucketBackend(settings.redis_url)
+    return InMemoryBucketBackend()
+
+
+class RateLimiter:
+    """Per-user and per-chatbot token buckets for one kind of request."""
+
+    def __init__(self, scope: str, per_minute: float, chatbot_per_minute: float, burst: float = None, backend=None):
+        self.scope = scope
+        self.per_minute = per_minute
+        self.chatbot_per_minute = chatbot_per_minute
+        self.burst = burst
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_bucket_backend()
+        return self._backend
+
+    def _capacity(self, per_minute: float) -> float:
+        return self.burst or per_minute
+
+    def max_cost(self) -> float:
+        """The largest cost a single request can ever be granted; inf if unlimited."""
+        if not settings.rate_limit_enabled:
+            return math.inf
+        limits = [self._capacity(p) for p in (self.per_minute, self.chatbot_per_minute) if p > 0]
+        return min(limits, default=math.inf)
+
+    def _take(self, key: str, per_minute: float, cost: float) -> float:
+        if per_minute <= 0:
+            return 0.0
+        return self.backend.take(key, per_minute / 60.0, self._capacity(per_minute), cost)
+
+    def check(self, user_id: int, chatbot_id: int = None, cost: float = 1.0):
+        """Raise 429 with Retry-After if the user or chatbot is over its rate.
+
+        cost is the number of requests this one counts as, e.g. the size of a batch;
+        callers must reject costs above max_cost() first, as those never fit.
+        """
+        if not settings.rate_limit_enabled:
+            return
+        wait = self._take(f"{self.scope}:user:{user_id}", self.per_minute, cost)
+        if not wait and chatbot_id is not None:
+            wait = self._take(f"{self.scope}:chatbot:{chatbot_id}", self.chatbot_per_minute, cost)
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please slow down.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+class AdmissionController:
+    """Caps concurrent work of one kind, with a short bounded wait queue."""
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Server is at capacity ({self.name}: {reason}). Please retry shortly.",
+            headers={"Retry-After": str(settings.admission_retry_after)},
+        )
+
+    @contextmanager
+    def slot(self, wait: bool = False):
+        """Hold one in-flight slot for the duration of the block, or raise 503.
+
+        With wait=True the caller blocks until a slot frees up instead: for
+        background work that already bounds its own concurrency, such as the
+        workers of one /query/batch request. It doesn't take a place in the
+        wait queue, which is kept for interactive requests.
+        """
+        if self.max_in_flight <= 0:
+            yield
+            return
+
+        with self._condition:
+            if wait:
+                while self._in_flight >= self.max_in_flight:
+                    self._condition.wait()
+            elif self._in_flight >= self.max_in_flight:
+                if self._waiting >= self.max_queue:
+                    self._reject("queue full")
+                self._waiting += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("queue wait timed out")
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                # Wake everyone: a woken waiter may be one that has already given up
+                self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+query_rate_limiter = RateLimiter(
+    "query",
+    per_minute=settings.rate_limit_per_minute,
+    chatbot_per_minute=settings.chatbot_rate_limit_per_minute,
+    burst=settings.rate_limit_burst or None,
+)
+upload_rate_limiter = RateLimiter(
+    "upload",
+    per_minute=settings.upload_rate_limit_per_minute,
+    chatbot_per_minute=settings.upload_rate_limit_per_minute,
+)
+# Anonymous widget traffic: keyed by client IP (plus the chatbot), and by session
+# when the client sends one. Sessions are client-chosen, so the IP bucket is the real bound.
+public_ip_rate_limiter = RateLimiter(
+    "public-ip",
+    per_minute=settings.public_ip_rate_limit_per_minute,
+    chatbot_per_minute=settings.public_chatbot_rate_limit_per_minute,
+)
+public_rate_limiter = RateLimiter(
+    "public",
+    per_minute=settings.public_rate_limit_per_minute,
+    chatbot_per_minute=0,  # Already charged by public_ip_rate_limiter
+)
+llm_admission = AdmissionController(
+    "llm", settings.max_inflight_llm_calls, settings.admission_queue_size, settings.admission_queue_timeout
+)
+ingest_admission = AdmissionController(
+    "ingest", settings.max_inflight_ingestions, settings.admission_queue_size, settings.admission_queue_timeout
+)
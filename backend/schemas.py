@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 # User schemas
@@ -62,6 +62,12 @@ class ChatbotResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Query schemas
+class BatchQueryRequest(BaseModel):
+    user_id: int
+    chatbot_id: int
+    questions: List[str]
+
 # Analytics schemas
 class AnalyticsResponse(BaseModel):
     question: str
@@ -69,4 +75,15 @@ class AnalyticsResponse(BaseModel):
     timestamp: datetime
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+# Data source schemas
+class DataSourceResponse(BaseModel):
+    source: str
+    source_type: str
+    characters: int
+    error: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Prefork production server.
+
+The parent binds the listening socket, imports the app and loads the embedding
+model once, then forks ``settings.workers`` uvicorn workers that all accept on
+the shared socket. Model weights loaded before the fork are shared between
+workers copy-on-write instead of being loaded once per process.
+
+Signals handled by the parent:
+    SIGHUP           graceful worker recycle: fork a new set of workers, wait until
+                     they report ready, then gracefully stop the old ones
+    SIGTERM, SIGINT  graceful shutdown of all workers, then exit
+
+A recycle re-forks from the already-loaded parent, so it releases memory and
+resets worker state but does not pick up new code or settings; deploying new
+code needs a full restart of this process.
+
+Each worker reports readiness to the parent over a pipe once uvicorn is
+serving, and answers GET /ready with its worker id.
+"""
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+from config import settings
+
+logger = logging.getLogger("botly.serve")
+
+WORKER_ID_ENV = "BOTLY_WORKER_ID"
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def limit_threads_per_worker(workers: int):
+    """Split CPU threads between workers so N workers don't each spawn one BLAS/OpenMP thread per core.
+
+    Must run before torch/numpy are imported; an explicit OMP_NUM_THREADS wins.
+    """
+    threads = str(max(1, (os.cpu_count() or 1) // max(1, workers)))
+    os.environ.setdefault("OMP_NUM_THREADS", threads)
+    os.environ.setdefault("MKL_NUM_THREADS", threads)
+    # Tokenizer thread pools do not survive fork
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def preload():
+    """Import the app and warm up the heavy components in the parent, before forking.
+
+    Only the weights are loaded here: running inference in the parent would start
+    OpenMP thread pools, which do not survive fork.
+    """
+    import database
+    import main
+    import warmup
+
+    warmup.warm_up()
+
+    # Importing main ran init_db(); its pooled SQLite connection must not be
+    # carried across fork into the workers
+    database.engine.dispose()
+
+    # Move everything allocated so far out of the GC's reach, so collections in the
+    # workers don't touch (and therefore copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+    return main.app
+
+
+class Worker:
+    def __init__(self, pid: int, worker_id: int, generation: int, ready_fd: int):
+        self.pid = pid
+        self.worker_id = worker_id
+        self.generation = generation
+        self.ready_fd = ready_fd
+        self.ready = False
+
+
+class Arbiter:
+    def __init__(self, app, sock: socket.socket, num_workers: int, graceful_timeout: int):
+        self.app = app
+        self.sock = sock
+        self.num_workers = num_workers
+        self.graceful_timeout = graceful_timeout
+        self.workers = {}
+        self.generation = 0
+        self.next_worker_id = 0
+        self.pending_signals = []
+        self.recycle_started = None
+
+    # -- parent --------------------------------------------------------------
+
+    def run(self):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, self._queue_signal)
+
+        self._spawn_generation()
+        while True:
+            self._reap()
+            while self.pending_signals:
+                sig = self.pending_signals.pop(0)
+                if sig == signal.SIGHUP:
+                    self._begin_recycle()
+                elif sig in (signal.SIGTERM, signal.SIGINT):
+                    self._shutdown()
+                    return
+            self._maintain()
+            self._wait_for_ready(timeout=1.0)
+
+    def _queue_signal(self, signum, frame):
+        if signum != signal.SIGCHLD:
+            self.pending_signals.append(signum)
+
+    def _spawn_generation(self):
+        self.generation += 1
+        for _ in range(self.num_workers):
+            self._spawn(self.generation)
+
+    def _spawn(self, generation: int):
+        self.next_worker_id += 1
+        worker_id = self.next_worker_id
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._run_worker(worker_id, write_fd)
+            os._exit(0)
+        os.close(write_fd)
+        self.workers[pid] = Worker(pid, worker_id, generation, read_fd)
+        logger.info(f"Spawned worker {worker_id} (pid {pid}, generation {generation})")
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker:
+                os.close(worker.ready_fd)
+                logger.info(f"Worker {worker.worker_id} (pid {pid}) exited with status {status}")
+
+    def _maintain(self):
+        """Respawn crashed workers of the current generation and finish pending recycles."""
+        current = [w for w in self.workers.values() if w.generation == self.generation]
+        for _ in range(self.num_workers - len(current)):
+            self._spawn(self.generation)
+
+        if self.recycle_started is None:
+            return
+        old = [w for w in self.workers.values() if w.generation < self.generation]
+        all_ready = all(w.ready for w in current) and len(current) == self.num_workers
+        timed_out = time.monotonic() - self.recycle_started > self.graceful_timeout
+        if all_ready or timed_out:
+            if timed_out and not all_ready:
+                logger.warning("New workers not ready before timeout; stopping old generation anyway")
+            for worker in old:
+                self._signal(worker.pid, signal.SIGTERM)
+            self.recycle_started = None
+            logger.info(f"Worker recycle to generation {self.generation} complete")
+
+    def _begin_recycle(self):
+        if self.recycle_started is not None:
+            logger.info("Worker recycle already in progress")
+            return
+        logger.info("Graceful worker recycle requested")
+        self.recycle_started = time.monotonic()
+        self._spawn_generation()
+
+    def _wait_for_ready(self, timeout: float):
+        fds = {w.ready_fd: w for w in self.workers.values() if not w.ready}
+        if not fds:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            worker = fds[fd]
+            if os.read(fd, 1):
+                worker.ready = True
+                logger.info(f"Worker {worker.worker_id} (pid {worker.pid}) ready")
+
+    def _shutdown(self):
+        logger.info("Shutting down workers")
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGKILL)
+        self._reap()
+        self.sock.close()
+
+    @staticmethod
+    def _signal(pid: int, sig: int):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    # -- child ---------------------------------------------------------------
+
+    def _run_worker(self, worker_id: int, ready_fd: int):
+        import uvicorn
+        from database import engine
+
+        # SQLite connections can't be shared across fork(); start with a fresh pool,
+        # leaving any connection inherited from the parent to the parent
+        engine.dispose(close=False)
+
+        # Recycles are driven by the parent; uvicorn installs its own SIGTERM/SIGINT handlers
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        for worker in self.workers.values():
+            os.close(worker.ready_fd)
+        os.environ[WORKER_ID_ENV] = str(worker_id)
+
+        class ReadyServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                if self.started:
+                    os.write(ready_fd, b"1")
+                    os.close(ready_fd)
+
+        config = uvicorn.Config(
+            self.app,
+            log_level="info",
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        ReadyServer(config).run(sockets=[self.sock])
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO if not settings.debug else logging.DEBUG,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    workers = max(1, settings.workers)
+    port = int(os.environ.get("PORT", settings.port))
+
+    limit_threads_per_worker(workers)
+    sock = bind_socket(settings.host, port)
+    app = preload()
+
+    logger.info(f"Starting {workers} workers on http://{settings.host}:{port} (master pid {os.getpid()})")
+    Arbiter(app, sock, workers, settings.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
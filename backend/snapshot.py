@@ -0,0 +1,227 @@
+"""
+Portable single-file chatbot snapshots.
+
+A snapshot is an uncompressed tar stream:
+
+    manifest.json      format version, embedding model identity (name, backend,
+                       ONNX quantization), chatbot metadata and sources, and
+                       size + SHA-256 of every data file
+    manifest.sig       HMAC-SHA256 of manifest.json keyed with SECRET_KEY
+    data/index.faiss   FAISS index
+    data/index.pkl     docstore and id mapping
+
+Export streams the tar without buffering files in memory; import reads the
+stream member by member, verifies the signature before writing anything and
+the checksums before swapping the new data into place. Only nodes sharing
+SECRET_KEY accept each other's snapshots, which matters because index.pkl is
+unpickled when the vectorstore loads.
+"""
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tarfile
+import time
+import uuid
+from datetime import datetime
+
+from config import settings
+
+SNAPSHOT_FORMAT = "botly-chatbot-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILES = ("index.faiss", "index.pkl")
+CHUNK_SIZE = 1024 * 1024
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sign(manifest_bytes: bytes) -> str:
+    return hmac.new(settings.secret_key.encode(), manifest_bytes, hashlib.sha256).hexdigest()
+
+
+def _embedding_identity() -> dict:
+    """The encoder variant the index's vectors came from; torch and ONNX int8 vectors differ."""
+    from embeddings import EMBEDDING_MODEL_NAME
+
+    onnx = settings.embedding_backend == "onnx"
+    return {
+        "name": EMBEDDING_MODEL_NAME,
+        "backend": settings.embedding_backend,
+        "onnx_quantized": settings.onnx_quantized if onnx else None,
+    }
+
+
+def build_manifest(chatbot, user_dir: str) -> dict:
+    files = {}
+    for name in SNAPSHOT_FILES:
+        path = os.path.join(user_dir, name)
+        if not os.path.exists(path):
+            raise SnapshotError(f"Chatbot has no trained index ({name} missing)")
+        files[name] = {"size": os.path.getsize(path), "sha256": _sha256_file(path)}
+
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "embedding_model": _embedding_identity(),
+        "chatbot": {
+            "name": chatbot.name,
+            "description": chatbot.description,
+            "instructions": chatbot.instructions,
+            "data_source": chatbot.data_source,
+            "data_type": chatbot.data_type,
+            "last_trained": chatbot.last_trained.isoformat() if chatbot.last_trained else None,
+            "sources": [
+                {"source": ds.source, "source_type": ds.source_type, "characters": ds.characters, "error": ds.error}
+                for ds in chatbot.data_sources
+            ],
+        },
+        "files": files,
+    }
+
+
+def _tar_header(name: str, size: int) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def _padding(size: int) -> bytes:
+    remainder = size % BLOCK_SIZE
+    return b"\0" * (BLOCK_SIZE - remainder) if remainder else b""
+
+
+def export_snapshot(chatbot, user_dir: str):
+    """Yield the snapshot of the chatbot stored in user_dir as a stream of byte chunks.
+
+    The manifest (and therefore every checksum) is computed up front, so an error
+    such as a missing index is raised before the first chunk is produced.
+    """
+    manifest_bytes = json.dumps(build_manifest(chatbot, user_dir), indent=2).encode()
+    signature = _sign(manifest_bytes).encode()
+
+    def stream():
+        for name, payload in (("manifest.json", manifest_bytes), ("manifest.sig", signature)):
+            yield _tar_header(name, len(payload)) + payload + _padding(len(payload))
+
+        for name in SNAPSHOT_FILES:
+            path = os.path.join(user_dir, name)
+            size = os.path.getsize(path)
+            yield _tar_header(f"data/{name}", size)
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    yield chunk
+            yield _padding(size)
+
+        # End-of-archive marker
+        yield b"\0" * (BLOCK_SIZE * 2)
+
+    return stream()
+
+
+def _read_member(tar, member, limit: int = CHUNK_SIZE) -> bytes:
+    if member.size > limit:
+        raise SnapshotError(f"{member.name} is unexpectedly large")
+    return tar.extractfile(member).read()
+
+
+def _describe(identity: dict) -> str:
+    description = f"{identity.get('name')} ({identity.get('backend')}"
+    if identity.get("backend") == "onnx":
+        description += ", int8" if identity.get("onnx_quantized") else ", fp32"
+    return description + ")"
+
+
+def _validate_manifest(manifest: dict):
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError("Not a Botly chatbot snapshot")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {manifest.get('version')}")
+    snapshot_model = manifest.get("embedding_model", {})
+    node_model = _embedding_identity()
+    if any(snapshot_model.get(key) != value for key, value in node_model.items()):
+        raise SnapshotError(
+            f"Snapshot was embedded with {_describe(snapshot_model)}, this node uses {_describe(node_model)}"
+        )
+    if set(manifest.get("files", {})) != set(SNAPSHOT_FILES):
+        raise SnapshotError("Snapshot file list does not match this format version")
+
+
+def import_snapshot(fileobj, user_dir: str) -> dict:
+    """Read a snapshot stream from fileobj into user_dir, replacing its contents atomically.
+
+    Returns the verified manifest. Nothing in user_dir changes unless the whole
+    snapshot verifies.
+    """
+    parent = os.path.dirname(os.path.abspath(user_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".import-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+
+    try:
+        written = {}
+        try:
+            with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+                # Stream mode can't seek back, so each member is read before advancing
+                members = iter(tar)
+                first = next(members, None)
+                if not first or first.name != "manifest.json":
+                    raise SnapshotError("Snapshot must start with manifest.json")
+                manifest_bytes = _read_member(tar, first)
+                second = next(members, None)
+                if not second or second.name != "manifest.sig":
+                    raise SnapshotError("Snapshot is missing manifest.sig")
+                signature = _read_member(tar, second).decode()
+                if not hmac.compare_digest(_sign(manifest_bytes), signature):
+                    raise SnapshotError("Snapshot signature does not match; it was not produced by this deployment")
+                manifest = json.loads(manifest_bytes)
+                _validate_manifest(manifest)
+
+                for member in members:
+                    name = member.name[len("data/"):] if member.name.startswith("data/") else None
+                    if not member.isfile() or name not in SNAPSHOT_FILES or name in written:
+                        raise SnapshotError(f"Unexpected entry in snapshot: {member.name}")
+
+                    digest = hashlib.sha256()
+                    source = tar.extractfile(member)
+                    with open(os.path.join(staging, name), "wb") as out:
+                        while chunk := source.read(CHUNK_SIZE):
+                            digest.update(chunk)
+                            out.write(chunk)
+
+                    expected = manifest["files"][name]
+                    if member.size != expected["size"] or digest.hexdigest() != expected["sha256"]:
+                        raise SnapshotError(f"Checksum mismatch for {name}")
+                    written[name] = True
+        except (tarfile.TarError, EOFError) as e:
+            raise SnapshotError(f"Invalid or truncated snapshot: {e}")
+
+        missing = set(SNAPSHOT_FILES) - set(written)
+        if missing:
+            raise SnapshotError(f"Snapshot is truncated; missing {', '.join(sorted(missing))}")
+
+        previous = None
+        if os.path.exists(user_dir):
+            previous = f"{staging}.old"
+            os.rename(user_dir, previous)
+        os.rename(staging, user_dir)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
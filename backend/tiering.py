@@ -0,0 +1,302 @@
+"""
+Cold-chatbot storage tiering.
+
+Chatbots whose last activity (latest Analytics row, or last training) is older
+than TIERING_IDLE_DAYS are packed into a compressed archive under ARCHIVE_DIR
+and removed from the hot storage directory. If hot storage is still over
+STORAGE_DISK_BUDGET_MB, the least recently active chatbots are archived too.
+The next query for an archived chatbot rehydrates it transparently.
+
+Per-chatbot flock()s coordinate this across threads and prefork workers:
+readers hold a shared lock while they use a chatbot's files, archiving takes
+an exclusive lock without waiting and skips busy chatbots, and rehydration
+takes an exclusive lock and waits. Retraining holds a separate per-chatbot
+write lock from wiping the directory until the new index is saved, which the
+archiver also skips, so a half-written index is never archived.
+"""
+import fcntl
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from batcher import percentile
+from config import settings
+from database import SessionLocal
+from models import Analytics, Chatbot
+
+logger = logging.getLogger(__name__)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class TieringManager:
+    def __init__(self, storage_dir: str, archive_dir: str):
+        self.storage_dir = storage_dir
+        self.archive_dir = archive_dir
+        self.lock_dir = os.path.join(archive_dir, ".locks")
+        os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._stats_lock = threading.Lock()
+        self._last_access = {}
+        self.rehydration_times = deque(maxlen=1000)
+        self.rehydrations = 0
+        self.archived = 0
+        self.bytes_before_archive = 0
+        self.bytes_after_archive = 0
+        self._pid = None
+
+    def hot_dir(self, user_id: int, chatbot_id: int) -> str:
+        return os.path.join(self.storage_dir, str(user_id), str(chatbot_id))
+
+    def archive_path(self, user_id: int, chatbot_id: int) -> str:
+        return os.path.join(self.archive_dir, str(user_id), f"{chatbot_id}.tar.gz")
+
+    @contextmanager
+    def _flock(self, user_id: int, chatbot_id: int, mode: int, kind: str = ""):
+        fd = os.open(os.path.join(self.lock_dir, f"{user_id}-{chatbot_id}{kind}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield fd
+        finally:
+            os.close(fd)
+
+    # -- hot path ------------------------------------------------------------
+
+    @contextmanager
+    def hydrated(self, user_id: int, chatbot_id: int):
+        """Hold the chatbot's files in hot storage for the block, rehydrating if archived.
+
+        Yields whether the chatbot has data at all.
+        """
+        with self._flock(user_id, chatbot_id, fcntl.LOCK_SH) as fd:
+            if not os.path.exists(self.hot_dir(user_id, chatbot_id)):
+                if not os.path.exists(self.archive_path(user_id, chatbot_id)):
+                    yield False
+                    return
+                # Drop the shared lock before waiting for the exclusive one, or two
+                # readers upgrading at once would deadlock on each other
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._rehydrate(user_id, chatbot_id)
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            with self._stats_lock:
+                self._last_access[(user_id, chatbot_id)] = time.time()
+            yield True
+
+    def _rehydrate(self, user_id: int, chatbot_id: int):
+        # Caller holds the exclusive lock; another process may have finished first
+        hot_dir = self.hot_dir(user_id, chatbot_id)
+        archive = self.archive_path(user_id, chatbot_id)
+        if os.path.exists(hot_dir) or not os.path.exists(archive):
+            return
+
+        started = time.perf_counter()
+        staging = f"{hot_dir}.rehydrate-{uuid.uuid4().hex}"
+        os.makedirs(staging)
+        try:
+            with tarfile.open(archive, "r:gz") as tar:
+                for member in tar:
+                    # Archives only ever contain flat regular files written by _archive
+                    if not member.isfile() or os.path.basename(member.name) != member.name:
+                        raise ValueError(f"Unexpected entry {member.name} in {archive}")
+                    with tar.extractfile(member) as source, open(os.path.join(staging, member.name), "wb") as out:
+                        shutil.copyfileobj(source, out)
+            os.rename(staging, hot_dir)
+        finally:
+            if os.path.exists(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+        os.remove(archive)
+
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.rehydrations += 1
+            self.rehydration_times.append(elapsed)
+        logger.info(f"Rehydrated chatbot {chatbot_id} in {elapsed * 1000:.0f}ms")
+
+    @contextmanager
+    def exclusive(self, user_id: int, chatbot_id: int):
+        """Hold the chatbot's lock exclusively: no readers, rehydration or archiving meanwhile.
+
+        Use drop_archive(), not discard(), inside the block.
+        """
+        with self._flock(user_id, chatbot_id, fcntl.LOCK_EX):
+            yield
+
+    @contextmanager
+    def writing(self, user_id: int, chatbot_id: int):
+        """Mark the chatbot as being rebuilt for the block; the archiver skips it.
+
+        Unlike exclusive(), readers aren't blocked, so this can be held for a whole
+        ingestion (including crawling). Concurrent writers to one chatbot serialize.
+        """
+        with self._flock(user_id, chatbot_id, fcntl.LOCK_EX, kind=".write"):
+            yield
+
+    def drop_archive(self, user_id: int, chatbot_id: int):
+        """Remove the archived copy; the caller holds exclusive()."""
+        archive = self.archive_path(user_id, chatbot_id)
+        if os.path.exists(archive):
+            os.remove(archive)
+
+    def discard(self, user_id: int, chatbot_id: int):
+        """Drop the archived copy, e.g. because the chatbot was retrained or deleted."""
+        with self.exclusive(user_id, chatbot_id):
+            self.drop_archive(user_id, chatbot_id)
+
+    # -- background pass -----------------------------------------------------
+
+    def _archive(self, user_id: int, chatbot_id: int) -> bool:
+        try:
+            with self._flock(user_id, chatbot_id, fcntl.LOCK_EX | fcntl.LOCK_NB), \
+                    self._flock(user_id, chatbot_id, fcntl.LOCK_EX | fcntl.LOCK_NB, kind=".write"):
+                hot_dir = self.hot_dir(user_id, chatbot_id)
+                if not os.path.isdir(hot_dir):
+                    return False
+                archive = self.archive_path(user_id, chatbot_id)
+                os.makedirs(os.path.dirname(archive), exist_ok=True)
+                tmp = f"{archive}.tmp-{uuid.uuid4().hex}"
+                try:
+                    with tarfile.open(tmp, "w:gz", compresslevel=settings.tiering_compress_level) as tar:
+                        for name in sorted(os.listdir(hot_dir)):
+                            path = os.path.join(hot_dir, name)
+                            if os.path.isfile(path):
+                                tar.add(path, arcname=name)
+                    with open(tmp, "rb") as f:
+                        os.fsync(f.fileno())
+                    os.rename(tmp, archive)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+
+                before, after = _dir_size(hot_dir), os.path.getsize(archive)
+                shutil.rmtree(hot_dir)
+        except BlockingIOError:
+            return False  # In use or being retrained right now; try again next pass
+
+        with self._stats_lock:
+            self.archived += 1
+            self.bytes_before_archive += before
+            self.bytes_after_archive += after
+        logger.info(f"Archived chatbot {chatbot_id}: {before} -> {after} bytes")
+        return True
+
+    def _candidates(self, db):
+        """Hot chatbots with their last activity time, least recently active first."""
+        last_query = func.max(Analytics.timestamp)
+        rows = (
+            db.query(Chatbot.id, Chatbot.user_id, Chatbot.last_trained, last_query)
+            .outerjoin(Analytics, Analytics.chatbot_id == Chatbot.id)
+            .filter(Chatbot.has_data == True)
+            .group_by(Chatbot.id, Chatbot.user_id, Chatbot.last_trained)
+            .all()
+        )
+        candidates = []
+        for chatbot_id, user_id, last_trained, last_queried in rows:
+            if not os.path.isdir(self.hot_dir(user_id, chatbot_id)):
+                continue
+            last_active = max(t for t in (last_trained, last_queried, datetime.min) if t is not None)
+            local_access = self._last_access.get((user_id, chatbot_id))
+            if local_access:
+                last_active = max(last_active, datetime.utcfromtimestamp(local_access))
+            candidates.append((last_active, user_id, chatbot_id))
+        return sorted(candidates)
+
+    def run_pass(self) -> dict:
+        """Archive idle chatbots, then enforce the disk budget. Returns what was done."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        pass_lock = os.open(os.path.join(self.lock_dir, "pass.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(pass_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return {"skipped": "another worker is running a tiering pass"}
+
+            db = SessionLocal()
+            try:
+                candidates = self._candidates(db)
+            finally:
+                db.close()
+
+            now = datetime.utcnow()
+            idle_before = now - timedelta(days=settings.tiering_idle_days)
+            keep_after = now - timedelta(seconds=settings.tiering_min_hot_seconds)
+            archived_idle = archived_budget = 0
+
+            remaining = []
+            for last_active, user_id, chatbot_id in candidates:
+                if last_active < idle_before and self._archive(user_id, chatbot_id):
+                    archived_idle += 1
+                else:
+                    remaining.append((last_active, user_id, chatbot_id))
+
+            budget = settings.storage_disk_budget_mb * 1024 * 1024
+            if budget:
+                usage = _dir_size(self.storage_dir)
+                for last_active, user_id, chatbot_id in remaining:
+                    if usage <= budget:
+                        break
+                    if last_active > keep_after:
+                        break  # Everything left is in active use; don't thrash
+                    size = _dir_size(self.hot_dir(user_id, chatbot_id))
+                    if self._archive(user_id, chatbot_id):
+                        archived_budget += 1
+                        usage -= size
+                if usage > budget:
+                    logger.warning(f"Hot storage {usage} bytes is over the {budget} byte budget")
+
+            return {"archived_idle": archived_idle, "archived_for_budget": archived_budget}
+        finally:
+            os.close(pass_lock)
+
+    def start(self):
+        """Run tiering passes in a background thread of this process."""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        threading.Thread(target=self._loop, name="storage-tiering", daemon=True).start()
+
+    def _loop(self):
+        while True:
+            time.sleep(settings.tiering_interval)
+            try:
+                result = self.run_pass()
+                if result.get("archived_idle") or result.get("archived_for_budget"):
+                    logger.info(f"Tiering pass: {result}")
+            except Exception as e:
+                logger.error(f"Tiering pass failed: {e}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            times = sorted(self.rehydration_times)
+            return {
+                "hot_bytes": _dir_size(self.storage_dir),
+                "archive_bytes": _dir_size(self.archive_dir),
+                "disk_budget_bytes": settings.storage_disk_budget_mb * 1024 * 1024,
+                "archived": self.archived,
+                "compression_ratio": round(self.bytes_after_archive / self.bytes_before_archive, 3)
+                if self.bytes_before_archive else None,
+                "rehydrations": self.rehydrations,
+                "rehydration_ms": {
+                    "p50": round(percentile(times, 50) * 1000, 1),
+                    "p95": round(percentile(times, 95) * 1000, 1),
+                    "max": round(times[-1] * 1000, 1) if times else 0.0,
+                },
+            }
@@ -1,92 +1,137 @@
 ### chatbot_saas_backend/utils.py
+# Heavy dependencies (PyMuPDF, lxml/BeautifulSoup, FAISS, LangChain, sentence-transformers)
+# are imported inside the functions that need them so that importing this module,
+# and therefore booting the API, stays fast. warmup.py loads them ahead of traffic.
+import logging
 import os
-import requests
-from bs4 import BeautifulSoup
-import fitz  # PyMuPDF
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from config import settings
+from database import get_db, init_db, SessionLocal  # re-exported for existing imports
 
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_core.documents import Document
+logger = logging.getLogger(__name__)
 
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.llms import OpenAI
-from langchain_community.docstore import InMemoryDocstore
-from langchain_community.chains import RetrievalQA   # ✅ FIXED
-
-from sentence_transformers import SentenceTransformer
-import numpy as np
-import faiss
-
-from langchain_core.embeddings import Embeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-
-import openai
-from openai import APIError, RateLimitError, AuthenticationError
-
-
-
-
-
-class MySentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(model_name)
-
-    def embed_documents(self, texts):
-        return [self.model.encode(text).tolist() for text in texts]
-
-    def embed_query(self, text):
-        return self.model.encode(text).tolist()
+def extract_text_from_pdf(pdf_path):
+    import fitz  # PyMuPDF
 
-class CustomSentenceTransformerEmbeddings(Embeddings):
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    text = ""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            text += page.get_text()
+    return text
 
-    def embed_documents(self, texts):
-        return [self.model.encode(text).astype(np.float32) for text in texts]
+def extract_text_from_txt(txt_path):
+    with open(txt_path, "rb") as f:
+        raw = f.read()
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
 
-    def embed_query(self, text):
-        return self.model.encode(text).astype(np.float32)
+def extract_text_from_docx(docx_path):
+    try:
+        import docx  # python-docx
+    except ImportError as e:
+        raise RuntimeError("DOCX support requires the python-docx package") from e
+
+    document = docx.Document(docx_path)
+    parts = [paragraph.text for paragraph in document.paragraphs if paragraph.text.strip()]
+    for table in document.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                parts.append(" | ".join(cells))
+    return "\n".join(parts)
+
+FILE_EXTRACTORS = {
+    "pdf": extract_text_from_pdf,
+    "txt": extract_text_from_txt,
+    "docx": extract_text_from_docx,
+}
+
+def file_extension(filename):
+    return os.path.splitext(filename)[1].lstrip(".").lower()
+
+def extract_text_from_file(file_path):
+    """Extract text from a file using the extractor for its extension."""
+    extractor = FILE_EXTRACTORS.get(file_extension(file_path))
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {os.path.basename(file_path)}")
+    return extractor(file_path)
+
+def _extract_source(kind, target):
+    """Run one extraction, returning (parts, error, pages) so one bad source doesn't fail the batch.
+
+    parts is a list of (source, text): the file's text, or one entry per crawled
+    page. pages holds the crawler's per-page extraction stats for websites and
+    is empty for files.
+    """
+    pages = []
+    try:
+        if kind == "file":
+            return [(os.path.basename(target), extract_text_from_file(target))], None, pages
+        return crawl_website(target, report=pages), None, pages
+    except Exception as e:
+        return [], str(e), pages
 
+def extract_sources(file_paths, urls, max_workers=None):
+    """
+    Extract text from many files and websites in parallel.
 
-DATABASE_URL = "sqlite:///./chatbot.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Files are CPU-bound and run in a process pool (spawned, so the children don't
+    inherit the parent's threads or model); crawls are I/O-bound and run in a
+    thread pool. Both run concurrently.
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+    Returns:
+        List of dicts with source, source_type, parts ((source, text) per file or
+        crawled page), characters, error and pages (per-page crawl stats, see
+        crawl_website), in input order
+    """
+    max_workers = max_workers or settings.ingest_workers
+    file_paths, urls = list(file_paths or []), list(urls or [])
 
-def get_db():
-    db = SessionLocal()
+    file_pool = None
+    if len(file_paths) > 1:
+        file_pool = ProcessPoolExecutor(max_workers=min(max_workers, len(file_paths)), mp_context=get_context("spawn"))
     try:
-        yield db
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(file_paths) + len(urls)))) as thread_pool:
+            pool_for_files = file_pool or thread_pool
+            futures = [("file", path, pool_for_files.submit(_extract_source, "file", path)) for path in file_paths]
+            futures += [("website", url, thread_pool.submit(_extract_source, "website", url)) for url in urls]
+            results = []
+            for kind, target, future in futures:
+                parts, error, pages = future.result()
+                results.append({
+                    "source": os.path.basename(target) if kind == "file" else target,
+                    "source_type": kind,
+                    "parts": parts,
+                    "characters": sum(len(text) for _, text in parts),
+                    "error": error,
+                    "pages": pages,
+                })
+            return results
     finally:
-        db.close()
-
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+        if file_pool:
+            file_pool.shutdown()
 
-def extract_text_from_website(url, max_pages=50, delay=1):
+def crawl_website(url, max_pages=50, delay=1, report=None):
     """
-    Crawl all pages within a website and extract text content.
+    Crawl all pages within a website and extract their main-content text.
     
     Args:
         url: Starting URL to crawl from
         max_pages: Maximum number of pages to crawl (default: 50)
         delay: Delay between requests in seconds (default: 1)
+        report: Optional list; per-page extraction stats (url, raw vs. extracted bytes,
+            how the main content was found) are appended to it
     
     Returns:
-        Combined text content from all crawled pages
+        List of (page_url, text) for the crawled pages that had any text
     """
     import time
-    from urllib.parse import urljoin, urlparse
+    from urllib.parse import urlparse
+    import requests
+    from html_extract import extract_page
     
     # Get the base domain to ensure we only crawl internal links
     parsed_url = urlparse(url)
@@ -94,7 +139,8 @@ def extract_text_from_website(url, max_pages=50, delay=1):
     
     visited_urls = set()
     urls_to_visit = [url]
-    all_text = []
+    page_texts = []
+    raw_total = text_total = 0
     
     while urls_to_visit and len(visited_urls) < max_pages:
         current_url = urls_to_visit.pop(0)
@@ -108,21 +154,24 @@ def extract_text_from_website(url, max_pages=50, delay=1):
             response = requests.get(current_url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            # Main-content text and absolute links from a single parse
+            page = extract_page(response.text, current_url)
+            if page.text.strip():  # Only add if there's actual content
+                page_texts.append((current_url, page.text))
             
-            # Extract text content
-            page_text = soup.get_text(separator=' ', strip=True)
-            if page_text.strip():  # Only add if there's actual content
-                all_text.append(f"\n--- Content from {current_url} ---\n{page_text}")
+            raw_total += page.raw_bytes
+            text_total += page.text_bytes
+            logger.debug(
+                f"Extracted {page.text_bytes} of {page.raw_bytes} bytes from {current_url} "
+                f"({page.parser}, main content: {page.main_content})"
+            )
+            if report is not None:
+                report.append({"url": current_url, **page.stats()})
             
             visited_urls.add(current_url)
             
             # Find all internal links on this page
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                
-                # Convert relative URLs to absolute URLs
-                absolute_url = urljoin(current_url, href)
+            for absolute_url in page.links:
                 parsed_link = urlparse(absolute_url)
                 
                 # Only follow internal links (same domain)
@@ -148,17 +197,57 @@ def extract_text_from_website(url, max_pages=50, delay=1):
             print(f"Unexpected error crawling {current_url}: {str(e)}")
             continue
     
-    print(f"Crawling completed. Visited {len(visited_urls)} pages.")
-    return '\n\n'.join(all_text) if all_text else ""
+    logger.info(f"Crawled {url}: visited {len(visited_urls)} pages, kept {text_total} of {raw_total} raw bytes as text")
+    return page_texts
 
 def split_and_embed(text, user_dir):
-    # Chunk the text
+    return split_and_embed_sources([(None, text)], user_dir)
+
+def split_and_embed_sources(sources, user_dir):
+    """
+    Chunk and embed several sources into one FAISS index in a single batched pass.
+
+    Duplicate chunks are dropped before embedding (see dedup.py) when
+    DEDUP_ENABLED is set.
+
+    Args:
+        sources: Iterable of (source_name, text), e.g. one per file or crawled page;
+            chunks keep source_name as metadata
+        user_dir: Directory the vectorstore is saved to
+
+    Returns:
+        Dedup stats: chunks, kept, exact_duplicates, near_duplicates, vectors_saved
+        and vector_bytes_saved
+    """
+    import numpy as np
+    import faiss
+    from langchain_core.documents import Document
+    from langchain_community.docstore import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from embeddings import MySentenceTransformerEmbeddings
+    from dedup import chunk_sources
+
+    # Chunk the text; repeated lines get chunks of their own so their copies can be dropped
     chunk_size = 500
-    chunks = [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
-    docs = [Document(page_content=chunk) for chunk in chunks]
+    docs = [
+        Document(page_content=chunk, metadata={"source": source} if source else {})
+        for source, chunk in chunk_sources(sources, chunk_size, isolate_repeated=settings.dedup_enabled)
+    ]
+
+    # Drop repeated boilerplate before it costs encoder time and index space
+    if settings.dedup_enabled:
+        from dedup import deduplicate
+        docs, stats = deduplicate(
+            docs,
+            threshold=settings.dedup_similarity,
+            num_perm=settings.dedup_num_perm,
+            shingle_size=settings.dedup_shingle_size,
+        )
+    else:
+        stats = {"chunks": len(docs), "kept": len(docs), "exact_duplicates": 0, "near_duplicates": 0, "vectors_saved": 0}
 
     # Use custom SentenceTransformer embedding
-    embedding = MySentenceTransformerEmbeddings("all-MiniLM-L6-v2")
+    embedding = MySentenceTransformerEmbeddings()
 
     # Compute embeddings
     vectors = embedding.embed_documents([doc.page_content for doc in docs])
@@ -181,19 +270,29 @@ def split_and_embed(text, user_dir):
 
     # Save to disk
     vectorstore.save_local(user_dir)
+
+    stats["vector_bytes_saved"] = stats["vectors_saved"] * vectors.shape[1] * vectors.itemsize
+    return stats
     
 
 def load_vectorstore(user_dir):
+    from langchain_community.vectorstores import FAISS
+    from embeddings import CustomSentenceTransformerEmbeddings
+
     embedding_function = CustomSentenceTransformerEmbeddings()
     return FAISS.load_local(user_dir, embedding_function, allow_dangerous_deserialization=True)  # ✅ Only do this if user_dir is trusted
 
 
 def get_openai_answer(question: str, user_dir: str, api_key: str) -> str:
     try:
+        from langchain_community.vectorstores import FAISS
+        from langchain_community.chains import RetrievalQA
+        from embeddings import MySentenceTransformerEmbeddings
+
         # OpenAI Embeddings
      
 
-        embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        embeddings = MySentenceTransformerEmbeddings()
 
 
 
@@ -205,16 +304,9 @@ def get_openai_answer(question: str, user_dir: str, api_key: str) -> str:
         )
         retriever = vectorstore.as_retriever()
 
-        # OpenAI LLM
-        llm = ChatOpenAI(
-            model="gpt-4o-mini",  # gpt-4o-mini routes here
-            openai_api_key=api_key,
-            temperature=0.7,
-        )
-
         # QA Chain
         qa = RetrievalQA.from_chain_type(
-            llm=llm,
+            llm=_chat_llm(api_key),
             retriever=retriever,
             return_source_documents=False,
             chain_type="stuff"
@@ -225,3 +317,53 @@ def get_openai_answer(question: str, user_dir: str, api_key: str) -> str:
 
     except Exception as e:
         return f"❌ Unexpected error: {str(e)}"
+
+
+def _chat_llm(api_key: str):
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model="gpt-4o-mini",  # gpt-4o-mini routes here
+        openai_api_key=api_key,
+        openai_api_base=settings.openai_base_url or None,
+        temperature=0.7,
+    )
+
+
+def retrieve_for_questions(questions, user_dir: str, k: int = 4):
+    """Return the top-k documents for each question, in question order.
+
+    All questions are embedded in one encode and searched with one FAISS
+    call, instead of one of each per question as the retriever would do.
+    k matches the retriever's default used by get_openai_answer.
+    """
+    from langchain_community.vectorstores import FAISS
+    from embeddings import MySentenceTransformerEmbeddings, get_encoder
+
+    vectorstore = FAISS.load_local(
+        user_dir,
+        MySentenceTransformerEmbeddings(),
+        allow_dangerous_deserialization=True  # ✅ Only do this if user_dir is trusted
+    )
+    vectors = get_encoder().encode(questions, batch_size=len(questions))
+    _, ids = vectorstore.index.search(vectors, k)
+
+    results = []
+    for row in ids:
+        # FAISS pads with -1 when the index holds fewer than k vectors
+        results.append([
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            for i in row if i != -1
+        ])
+    return results
+
+
+def build_qa_chain(api_key: str):
+    """The "stuff" chain get_openai_answer runs, minus retrieval.
+
+    Invoke with {"input_documents": docs, "question": question}; the answer is
+    in "output_text".
+    """
+    from langchain.chains.question_answering import load_qa_chain
+
+    return load_qa_chain(_chat_llm(api_key), chain_type="stuff")
@@ -0,0 +1,105 @@
+"""
+Explicit warm-up of the heavy ML, PDF and crawler stacks, with a startup report.
+
+The API boots without importing any of these (see utils.py); warm_up() loads
+them ahead of traffic, recording how long each component took so slow boots can
+be traced to a specific dependency.
+"""
+import importlib
+import logging
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+def _load_embedding_model():
+    from embeddings import get_encoder
+    get_encoder()
+
+def components():
+    """Components to warm up, in order, for the configured embedding backend.
+
+    Order matters: later components reuse modules imported by earlier ones, so
+    each entry's time is what it added on top of everything before it.
+    """
+    if settings.embedding_backend == "onnx":
+        encoder_stack = [("onnxruntime", ["onnxruntime", "tokenizers"])]
+    else:
+        encoder_stack = [("torch", ["torch"]), ("sentence_transformers", ["sentence_transformers"])]
+    return [("numpy", ["numpy"])] + encoder_stack + [
+        ("faiss", ["faiss"]),
+        ("langchain", ["langchain_core.documents", "langchain_community.docstore", "langchain_community.vectorstores"]),
+        ("llm", ["openai", "langchain_openai", "langchain_community.chains"]),
+        ("pdf", ["fitz"]),
+        ("crawler", ["requests", "bs4", "html_extract"]),
+        ("embedding_model", _load_embedding_model),
+    ]
+
+_lock = threading.Lock()
+_report = {
+    "app_import_s": None,
+    "components": {},
+    "warmup_s": None,
+    "ready": False,
+}
+
+def record_app_import(seconds: float):
+    with _lock:
+        _report["app_import_s"] = round(seconds, 3)
+
+def is_ready() -> bool:
+    """Ready to serve queries: the embedding model is loaded.
+
+    Other components only affect the endpoints that use them, so a failed
+    optional import (e.g. PDF support) doesn't hold readiness back. Without
+    startup warm-up nothing would ever load ahead of traffic, so the worker is
+    ready immediately and loads the model on first use.
+    """
+    return _report["ready"] or not settings.warmup_on_startup
+
+def get_report() -> dict:
+    with _lock:
+        return {**_report, "components": dict(_report["components"])}
+
+def warm_up():
+    """Import every heavy component and load the embedding model, timing each step.
+
+    Safe to call more than once; already-loaded components report ~0s.
+    """
+    started = time.perf_counter()
+    for name, target in components():
+        component_started = time.perf_counter()
+        error = None
+        try:
+            if callable(target):
+                target()
+            else:
+                for module in target:
+                    importlib.import_module(module)
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Warm-up of {name} failed: {error}")
+        elapsed = round(time.perf_counter() - component_started, 3)
+        with _lock:
+            _report["components"][name] = {"seconds": elapsed, "error": error} if error else {"seconds": elapsed}
+
+    with _lock:
+        _report["warmup_s"] = round(time.perf_counter() - started, 3)
+        model = _report["components"].get("embedding_model")
+        _report["ready"] = model is not None and "error" not in model
+    log_report()
+
+def warm_up_in_background() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+def log_report():
+    report = get_report()
+    lines = [f"Startup report: app import {report['app_import_s']}s, warm-up {report['warmup_s']}s"]
+    for name, component in report["components"].items():
+        suffix = f" (failed: {component['error']})" if "error" in component else ""
+        lines.append(f"  {name:<22}{component['seconds']:>8.3f}s{suffix}")
+    logger.info("\n".join(lines))